@@ -0,0 +1,688 @@
+# bench.py
+# Offline load test for bot.py: drives the real command callbacks against an
+# in-process fake guild/channel/interaction layer. No network or token needed.
+#
+#   python bench.py --users 2000 --latency-ms 60 --ratelimit-rate 0.01
+#
+import argparse
+import asyncio
+import contextvars
+import datetime
+import importlib
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+import discord
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_ids = itertools.count(1_000_000_000_000_000)
+# DB op counter for the interaction currently running (inherited by tasks it spawns)
+_db_ops = contextvars.ContextVar("acrp_bench_db_ops", default=None)
+
+
+def next_id() -> int:
+    return next(_ids)
+
+
+# ---- Fake Discord layer ----
+
+class FakeAPI:
+    """Simulated REST latency and 429s, counted per route.
+
+    A 429 costs retry_after seconds and the call is retried, as discord.py's
+    HTTP client does.
+    """
+
+    def __init__(self, latency: float, jitter: float, ratelimit_rate: float, retry_after: float):
+        self.latency = latency
+        self.jitter = jitter
+        self.ratelimit_rate = ratelimit_rate
+        self.retry_after = retry_after
+        self.calls = Counter()
+        self.ratelimits = Counter()
+
+    async def call(self, route: str):
+        self.calls[route] += 1
+        while random.random() < self.ratelimit_rate:
+            self.ratelimits[route] += 1
+            await asyncio.sleep(self.retry_after)
+        await asyncio.sleep(max(0.0, random.gauss(self.latency, self.jitter)))
+
+
+class FakeRole:
+    def __init__(self, guild, name: str):
+        self.id = next_id()
+        self.guild = guild
+        self.name = name
+        self.members = []
+
+    @property
+    def mention(self) -> str:
+        return f"<@&{self.id}>"
+
+
+class FakeMember:
+    def __init__(self, guild, name: str, roles=()):
+        self.id = next_id()
+        self.guild = guild
+        self.name = name
+        self.bot = False
+        self.status = discord.Status.online
+        self.roles = [guild.default_role] + list(roles)
+        for role in roles:
+            role.members.append(self)
+
+    @property
+    def mention(self) -> str:
+        return f"<@{self.id}>"
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class FakeMessage:
+    def __init__(self, author, content, embeds):
+        self.id = next_id()
+        self.author = author
+        self.content = content or ""
+        self.embeds = embeds
+        self.attachments = []
+        self.created_at = datetime.datetime.now(datetime.timezone.utc)
+
+
+class FakeCategory(discord.CategoryChannel):
+    # Subclassed so the bot's isinstance checks hold; state lives on the instance
+    overwrites = {}
+    category_id = None
+
+    def __init__(self, guild, name: str, overwrites=None, position: int = 0):
+        self.id = next_id()
+        self.guild = guild
+        self.name = name
+        self.position = position
+        self.overwrites = dict(overwrites or {})
+
+    async def delete(self, reason=None):
+        await self.guild.api.call("DELETE /channels/{channel_id}")
+        self.guild.remove_channel(self)
+
+
+class FakeTextChannel:
+    def __init__(self, guild, name: str, category=None, overwrites=None):
+        self.id = next_id()
+        self.guild = guild
+        self.name = name
+        self.category_id = category.id if category else None
+        self.overwrites = dict(overwrites or {})
+        self.messages = []
+
+    @property
+    def mention(self) -> str:
+        return f"<#{self.id}>"
+
+    async def send(self, content=None, *, embed=None, embeds=None, view=None, allowed_mentions=None):
+        await self.guild.api.call("POST /channels/{channel_id}/messages")
+        message = FakeMessage(self.guild.me, content, embeds or ([embed] if embed else []))
+        self.messages.append(message)
+        return message
+
+    async def set_permissions(self, target, **perms):
+        await self.guild.api.call("PUT /channels/{channel_id}/permissions")
+        self.overwrites[target] = discord.PermissionOverwrite(**perms)
+
+    async def edit(self, *, name=None, overwrites=None, reason=None):
+        await self.guild.api.call("PATCH /channels/{channel_id}")
+        if name is not None:
+            self.name = name
+        if overwrites is not None:
+            self.overwrites = dict(overwrites)
+
+    async def delete(self, reason=None):
+        await self.guild.api.call("DELETE /channels/{channel_id}")
+        self.guild.remove_channel(self)
+
+    async def history(self, limit=None, oldest_first=False):
+        # Paged like the real endpoint: one simulated request per 100 messages
+        messages = self.messages if oldest_first else list(reversed(self.messages))
+        for i, message in enumerate(messages[:limit]):
+            if i % 100 == 0:
+                await self.guild.api.call("GET /channels/{channel_id}/messages")
+            yield message
+
+
+class FakeGuild:
+    def __init__(self, api: FakeAPI, client):
+        self.id = next_id()
+        self.api = api
+        self.client = client
+        self._channels = {}
+        self._roles = {}
+        self._members = {}
+        self.default_role = FakeRole(self, "@everyone")
+        self.default_role.id = self.id
+        self._roles[self.id] = self.default_role
+        self.me = self.add_member("ACRP Utilities")
+        self.me.bot = True
+
+    @property
+    def channels(self):
+        return list(self._channels.values())
+
+    @property
+    def text_channels(self):
+        return [c for c in self._channels.values() if isinstance(c, FakeTextChannel)]
+
+    @property
+    def members(self):
+        return list(self._members.values())
+
+    def get_channel(self, channel_id):
+        return self._channels.get(channel_id)
+
+    def get_role(self, role_id):
+        return self._roles.get(role_id)
+
+    def get_member(self, member_id):
+        return self._members.get(member_id)
+
+    def add_role(self, name: str) -> FakeRole:
+        role = FakeRole(self, name)
+        self._roles[role.id] = role
+        return role
+
+    def add_member(self, name: str, roles=()) -> FakeMember:
+        member = FakeMember(self, name, roles)
+        self._members[member.id] = member
+        return member
+
+    def add_channel(self, channel):
+        self._channels[channel.id] = channel
+        self.client.dispatch("guild_channel_create", channel)
+        return channel
+
+    def remove_channel(self, channel):
+        if self._channels.pop(channel.id, None) is not None:
+            self.client.dispatch("guild_channel_delete", channel)
+
+    async def create_text_channel(self, name, *, overwrites=None, category=None, reason=None):
+        await self.api.call("POST /guilds/{guild_id}/channels")
+        return self.add_channel(FakeTextChannel(self, name, category, overwrites))
+
+    async def create_category(self, name, *, overwrites=None, position=0, reason=None):
+        await self.api.call("POST /guilds/{guild_id}/channels")
+        return self.add_channel(FakeCategory(self, name, overwrites, position))
+
+
+class RecordingViewStore(discord.ui.view.ViewStore):
+    # The real modal store, keeping the submit tasks it schedules
+    def __init__(self, state):
+        super().__init__(state)
+        self.tasks = []
+
+    def add_task(self, task):
+        super().add_task(task)
+        self.tasks.append(task)
+
+
+class FakeClient:
+    # Stands in for the gateway client where the bot looks up channels and guilds
+    def __init__(self, bot):
+        self.bot = bot
+        self.guilds = []
+        self.view_store = RecordingViewStore(bot._connection)
+
+    def get_channel(self, channel_id):
+        for guild in self.guilds:
+            channel = guild.get_channel(channel_id)
+            if channel is not None:
+                return channel
+        return None
+
+    def get_guild(self, guild_id):
+        return next((g for g in self.guilds if g.id == guild_id), None)
+
+    async def wait_until_ready(self):
+        return None
+
+    def dispatch(self, event: str, *args):
+        # Run the bot's @bot.event handler and listeners as the gateway would;
+        # Client.dispatch itself needs a logged-in client
+        method = f"on_{event}"
+        handlers = list(self.bot.extra_events.get(method, []))
+        if hasattr(self.bot, method):
+            handlers.append(getattr(self.bot, method))
+        for handler in handlers:
+            asyncio.get_running_loop().create_task(handler(*args))
+
+
+class FakeResponse:
+    def __init__(self, interaction):
+        self._interaction = interaction
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def _respond(self):
+        if self._done:
+            raise discord.InteractionResponded(self._interaction)
+        await self._interaction.guild.api.call("POST /interactions/{id}/{token}/callback")
+        self._done = True
+        self._interaction.responded_at = time.perf_counter()
+
+    async def send_message(self, content=None, *, embed=None, embeds=None, ephemeral=False, view=None):
+        await self._respond()
+
+    async def defer(self, *, ephemeral=False, thinking=False):
+        await self._respond()
+
+    async def send_modal(self, modal):
+        await self._respond()
+        # As InteractionResponse.send_modal does, so the submit can find it
+        self._interaction.guild.client.view_store.add_view(modal)
+        self._interaction.modal = modal
+
+
+class FakeFollowup:
+    def __init__(self, interaction):
+        self._interaction = interaction
+
+    async def send(self, content=None, *, embed=None, embeds=None, ephemeral=False, view=None):
+        await self._interaction.guild.api.call("POST /webhooks/{application_id}/{token}")
+
+
+class FakeInteraction:
+    def __init__(self, guild, user, channel=None):
+        self.guild = guild
+        self.user = user
+        self.channel = channel
+        self.guild_id = guild.id
+        self._state = None
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+        self.responded_at = None
+        self.modal = None
+
+
+# ---- Measurement ----
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.first_response = defaultdict(list)
+        self.db_ops = defaultdict(list)
+        self.errors = Counter()
+
+    async def run(self, name: str, interaction: FakeInteraction, coro):
+        counter = [0]
+        token = _db_ops.set(counter)
+        started = time.perf_counter()
+        try:
+            await coro
+        except Exception:
+            self.errors[name] += 1
+        finally:
+            _db_ops.reset(token)
+        self.latencies[name].append(time.perf_counter() - started)
+        if interaction.responded_at is not None:
+            self.first_response[name].append(interaction.responded_at - started)
+        # Background work spawned by the command may still add to the counter
+        self.db_ops[name].append(counter)
+
+
+def count_db_ops(storage):
+    read, write = storage.read, storage.write
+
+    async def counted_read(fn):
+        counter = _db_ops.get()
+        if counter is not None:
+            counter[0] += 1
+        return await read(fn)
+
+    async def counted_write(fn):
+        counter = _db_ops.get()
+        if counter is not None:
+            counter[0] += 1
+        return await write(fn)
+
+    storage.read, storage.write = counted_read, counted_write
+
+
+async def watch_loop_lag(samples: list, interval: float = 0.01):
+    # Oversleep beyond the requested interval is time the loop was blocked
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(time.perf_counter() - started - interval)
+
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+# ---- Scenario ----
+
+def build_guild(client, api: FakeAPI, users: int, staff: int) -> dict:
+    guild = FakeGuild(api, client)
+    client.guilds.append(guild)
+    gs_role = guild.add_role("General Support")
+    cs_role = guild.add_role("Community Support")
+    loa_role = guild.add_role("LOA")
+    return {
+        "guild": guild,
+        "gs_role": gs_role,
+        "cs_role": cs_role,
+        "loa_role": loa_role,
+        "admin": guild.add_member("admin", [gs_role, cs_role]),
+        "staff": [guild.add_member(f"staff{i}", [gs_role, cs_role]) for i in range(staff)],
+        "users": [guild.add_member(f"user{i}") for i in range(users)],
+        "assistance": guild.add_channel(FakeTextChannel(guild, "assistance")),
+        "general_requests": guild.add_channel(FakeTextChannel(guild, "general-requests")),
+        "community_requests": guild.add_channel(FakeTextChannel(guild, "community-requests")),
+        "logs": guild.add_channel(FakeTextChannel(guild, "ticket-logs")),
+        "category": guild.add_channel(FakeCategory(guild, "Your Tickets")),
+    }
+
+
+async def run_bench(args) -> dict:
+    botmod = importlib.import_module("bot")
+    utils = importlib.import_module("utils")
+    # Normally opened by setup_hook, which needs a Discord login
+    utils.init_db()
+    api = FakeAPI(args.latency_ms / 1000, args.jitter_ms / 1000, args.ratelimit_rate, args.retry_after)
+    client = FakeClient(botmod.bot)
+    botmod.bot.log_dispatcher.bot = client
+    botmod.bot.channel_pool.size = args.pool
+    # Admission control would otherwise turn away most of a synthetic rush
+    botmod._guild_opens.capacity = args.users + 1
+    count_db_ops(utils.get_storage())
+
+    recorder = Recorder()
+    lag = []
+    watcher = asyncio.create_task(watch_loop_lag(lag))
+    per_guild = max(1, args.users // args.guilds)
+    worlds = [build_guild(client, api, per_guild, args.staff) for _ in range(args.guilds)]
+    phases = {}
+
+    async def phase(name, calls):
+        started = time.perf_counter()
+        await asyncio.gather(*calls)
+        phases[name] = time.perf_counter() - started
+
+    # setup_support, once per guild
+    calls = []
+    for w in worlds:
+        interaction = FakeInteraction(w["guild"], w["admin"], w["assistance"])
+        calls.append(recorder.run("setup_support", interaction, botmod.setup_support.callback(
+            interaction, w["assistance"].id, w["general_requests"].id, w["community_requests"].id,
+            f"{w['gs_role'].id}", f"{w['cs_role'].id}", w["loa_role"].id, w["logs"].id, w["category"].id)))
+    await phase("setup_support", calls)
+
+    if args.pool:
+        for w in worlds:
+            cfg = await botmod.load_setup(w["guild"].id)
+            await botmod.bot.channel_pool.refill(w["guild"], cfg, botmod.bot.categories)
+
+    # Every virtual user picks a type from the dropdown, and all the forms are
+    # open at once before anyone submits
+    calls, forms = [], []
+    for w in worlds:
+        for i, user in enumerate(w["users"]):
+            interaction = FakeInteraction(w["guild"], user)
+            select = botmod.TicketSelect()
+            select._values = ["general" if i % 2 == 0 else "community"]
+            forms.append((w, user, interaction))
+            calls.append(recorder.run("ticket_select", interaction, select.callback(interaction)))
+    await phase("ticket_select", calls)
+
+    # Submits go through discord.py's ViewStore, which routes each one to its
+    # form by custom_id, exactly as a gateway MODAL_SUBMIT would
+    issue_texts = {}
+
+    async def submit(interaction, modal):
+        text = f"Benchmark issue from {interaction.user.id}: cannot spawn vehicle after server restart"
+        issue_texts[interaction.user.id] = text
+        components = [{"type": 1, "components": [{"type": 4, "custom_id": modal.issue.custom_id, "value": text}]}]
+        store = client.view_store
+        before = len(store.tasks)
+        store.dispatch_modal(modal.custom_id, interaction, components, {})
+        if len(store.tasks) == before:
+            raise RuntimeError(f"submit for form {modal.custom_id} was discarded")
+        await store.tasks[-1]
+
+    calls = []
+    for w, user, form in forms:
+        interaction = FakeInteraction(w["guild"], user)
+        calls.append(recorder.run("issue_modal_submit", interaction, submit(interaction, form.modal)))
+    await phase("issue_modal_submit", calls)
+
+    tickets, wrong_text = [], 0
+    for w in worlds:
+        for i, user in enumerate(w["users"]):
+            choice = "general" if i % 2 == 0 else "community"
+            channel_id = botmod._open_tickets.get((w["guild"].id, user.id, choice))
+            if channel_id:
+                # Each ticket must carry its own author's form text
+                ticket = await utils.get_ticket(channel_id)
+                if ticket is None or ticket["description"] != issue_texts.get(user.id):
+                    wrong_text += 1
+                channel = w["guild"].get_channel(channel_id)
+                # Some conversation for the transcript exporter to stream
+                for n in range(args.messages):
+                    channel.messages.append(FakeMessage(user if n % 2 else w["staff"][0], f"message {n}", []))
+                tickets.append((w, channel))
+
+    # Several staff race to /claim each ticket
+    calls = []
+    for w, channel in tickets:
+        for claimer in random.sample(w["staff"], min(args.claimers, len(w["staff"]))):
+            interaction = FakeInteraction(w["guild"], claimer, channel)
+            calls.append(recorder.run("claim", interaction, botmod.claim.callback(interaction)))
+    await phase("claim", calls)
+
+    calls = []
+    for w, channel in tickets:
+        interaction = FakeInteraction(w["guild"], random.choice(w["staff"]), channel)
+        calls.append(recorder.run("add_user", interaction, botmod.add_user.callback(interaction, random.choice(w["users"]))))
+    await phase("add_user", calls)
+
+    calls = []
+    for w, channel in tickets:
+        interaction = FakeInteraction(w["guild"], random.choice(w["staff"]), channel)
+        calls.append(recorder.run("close_ticket", interaction, botmod.close_ticket.callback(interaction)))
+    started = time.perf_counter()
+    await asyncio.gather(*calls)
+    # Transcript export and channel deletion continue in the background
+    while botmod.bot.transcripts._tasks:
+        await asyncio.gather(*list(botmod.bot.transcripts._tasks), return_exceptions=True)
+    phases["close_ticket"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    while botmod.bot.log_dispatcher.pending():
+        await asyncio.sleep(0.05)
+    phases["log_drain"] = time.perf_counter() - started
+
+    watcher.cancel()
+    # Each "Ticket Claimed" announcement is a /claim that won; more than one
+    # per channel means two staff were both told the ticket was theirs
+    winners = [sum(1 for m in channel.messages if m.embeds and m.embeds[0].title == "Ticket Claimed") for _, channel in tickets]
+    return {
+        "config": vars(args),
+        "tickets_requested": len(forms),
+        "tickets_opened": len(tickets),
+        "tickets_wrong_text": wrong_text,
+        "tickets_claimed": sum(1 for n in winners if n),
+        "double_claims": sum(1 for n in winners if n > 1),
+        "commands": {
+            name: {
+                "count": len(values),
+                "errors": recorder.errors[name],
+                "p50_ms": percentile(values, 50) * 1000,
+                "p95_ms": percentile(values, 95) * 1000,
+                "p99_ms": percentile(values, 99) * 1000,
+                "first_response_p99_ms": percentile(recorder.first_response[name], 99) * 1000,
+                "db_ops_per_call": statistics.mean(c[0] for c in recorder.db_ops[name]),
+            }
+            for name, values in recorder.latencies.items()
+        },
+        "phase_seconds": phases,
+        "api_calls": dict(api.calls),
+        "api_429s": dict(api.ratelimits),
+        "loop_lag": {
+            "max_ms": max(lag, default=0) * 1000,
+            "p99_ms": percentile(lag, 99) * 1000,
+            "blocked_ms": sum(x for x in lag if x > 0.005) * 1000,
+        },
+        "channel_pool": {"hits": sum(botmod.bot.channel_pool.hits.values()), "misses": sum(botmod.bot.channel_pool.misses.values())},
+    }
+
+
+# ---- Claim race ----
+
+def _race_worker(task) -> list:
+    # Runs in a separate process with its own connections, so the claims
+    # really do race inside SQLite rather than queueing on one writer thread
+    workdir, channel_ids, claimers, worker = task
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_DIR)
+    import utils
+    utils.init_db()
+
+    async def run():
+        claims = [(channel_id, worker * 1_000_000 + n) for channel_id in channel_ids for n in range(claimers)]
+        random.shuffle(claims)
+        results = await asyncio.gather(*(utils.claim_ticket(channel_id, claimer) for channel_id, claimer in claims))
+        return [(channel_id, claimer, won) for (channel_id, claimer), (won, _) in zip(claims, results)]
+
+    try:
+        return asyncio.run(run())
+    finally:
+        utils.close_db()
+
+
+def run_claim_race(args, workdir: str) -> dict:
+    # Hammers utils.claim_ticket from several processes; every ticket must
+    # end up with exactly one winner, and that winner must be the stored claimer
+    import multiprocessing
+    utils = importlib.import_module("utils")
+    channel_ids = [next_id() for _ in range(args.race_tickets)]
+
+    async def create():
+        await asyncio.gather(*(utils.create_ticket_record(1, channel_id, next_id(), "general", "race", int(time.time())) for channel_id in channel_ids))
+    asyncio.run(create())
+
+    started = time.perf_counter()
+    tasks = [(workdir, channel_ids, args.race_claimers, worker) for worker in range(args.race_processes)]
+    with multiprocessing.get_context("spawn").Pool(args.race_processes) as pool:
+        results = [row for rows in pool.map(_race_worker, tasks) for row in rows]
+    elapsed = time.perf_counter() - started
+
+    winners = defaultdict(list)
+    for channel_id, claimer, won in results:
+        if won:
+            winners[channel_id].append(claimer)
+
+    async def stored():
+        return await asyncio.gather(*(utils.get_ticket(channel_id) for channel_id in channel_ids))
+    mismatched = sum(
+        1 for ticket in asyncio.run(stored())
+        if winners[ticket["channel_id"]] != [ticket["claimed_by"]]
+    )
+    return {
+        "tickets": len(channel_ids),
+        "claims": len(results),
+        "seconds": elapsed,
+        "double_wins": sum(1 for channel_id in channel_ids if len(winners[channel_id]) > 1),
+        "no_wins": sum(1 for channel_id in channel_ids if not winners[channel_id]),
+        "mismatched": mismatched,
+    }
+
+
+def failures(result: dict) -> list:
+    problems = []
+    if result["tickets_opened"] != result["tickets_requested"]:
+        problems.append(f"{result['tickets_requested'] - result['tickets_opened']} submitted forms didn't open a ticket")
+    if result["tickets_wrong_text"]:
+        problems.append(f"{result['tickets_wrong_text']} tickets were opened with another user's issue text")
+    if result["double_claims"]:
+        problems.append(f"{result['double_claims']} tickets announced more than one /claim winner")
+    race = result.get("claim_race")
+    if race:
+        for key, text in (("double_wins", "had more than one winner"), ("no_wins", "had no winner"),
+                          ("mismatched", "stored a different claimer than the winner")):
+            if race[key]:
+                problems.append(f"claim race: {race[key]} tickets {text}")
+    return problems
+
+
+def print_report(result: dict):
+    print(f"tickets opened: {result['tickets_opened']}/{result['tickets_requested']}, wrong text: {result['tickets_wrong_text']}, claimed: {result['tickets_claimed']}, double claims: {result['double_claims']}")
+    print(f"{'command':<22}{'count':>7}{'err':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ack p99':>10}{'db ops':>8}")
+    for name, c in result["commands"].items():
+        print(f"{name:<22}{c['count']:>7}{c['errors']:>6}{c['p50_ms']:>10.1f}{c['p95_ms']:>10.1f}"
+              f"{c['p99_ms']:>10.1f}{c['first_response_p99_ms']:>10.1f}{c['db_ops_per_call']:>8.2f}")
+    lag = result["loop_lag"]
+    print(f"event loop lag: max {lag['max_ms']:.1f} ms, p99 {lag['p99_ms']:.1f} ms, blocked {lag['blocked_ms']:.0f} ms total")
+    print(f"API calls: {sum(result['api_calls'].values())}, 429s: {sum(result['api_429s'].values())}")
+    print(f"channel pool: {result['channel_pool']['hits']} hits / {result['channel_pool']['misses']} misses")
+    race = result.get("claim_race")
+    if race:
+        print(f"claim race: {race['claims']} claims on {race['tickets']} tickets in {race['seconds']:.2f}s, "
+              f"{race['double_wins']} double wins, {race['no_wins']} without a winner, {race['mismatched']} mismatched")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline load test for the ACRP Utilities bot.")
+    parser.add_argument("--users", type=int, default=1000, help="virtual users, each opening one ticket")
+    parser.add_argument("--guilds", type=int, default=1)
+    parser.add_argument("--staff", type=int, default=20, help="staff members per guild")
+    parser.add_argument("--claimers", type=int, default=3, help="staff racing to claim each ticket")
+    parser.add_argument("--messages", type=int, default=50, help="messages per ticket for transcript export")
+    parser.add_argument("--pool", type=int, default=0, help="warm channel pool size per ticket type")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="mean simulated API latency")
+    parser.add_argument("--jitter-ms", type=float, default=15.0)
+    parser.add_argument("--ratelimit-rate", type=float, default=0.0, help="probability an API call gets a 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="seconds a simulated 429 costs")
+    parser.add_argument("--race-tickets", type=int, default=50, help="tickets in the cross-process claim race (0 skips it)")
+    parser.add_argument("--race-claimers", type=int, default=100, help="claims per ticket from each race process")
+    parser.add_argument("--race-processes", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print the result as JSON")
+    args = parser.parse_args(argv)
+    random.seed(args.seed)
+
+    # bot.py reads config.json and creates its database in the working
+    # directory, so run in a scratch one
+    workdir = tempfile.mkdtemp(prefix="acrp-bench-")
+    with open(os.path.join(workdir, "config.json"), "w", encoding="utf-8") as f:
+        json.dump({"token": "offline-benchmark", "ticket_pool_size": 0}, f)
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_DIR)
+
+    result = asyncio.run(run_bench(args))
+    if args.race_tickets:
+        result["claim_race"] = run_claim_race(args, workdir)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
+    print(f"(scratch data in {workdir})", file=sys.stderr)
+    problems = failures(result)
+    for problem in problems:
+        print(f"FAIL: {problem}", file=sys.stderr)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
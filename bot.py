@@ -3,29 +3,623 @@ import discord
 from discord import app_commands
 from discord.ext import commands, tasks
 import asyncio
+import heapq
+import contextlib
 import time
+import datetime
 import json
 import os
-from utils import init_db, save_setup, load_setup, create_ticket_record, set_ticket_claim, get_ticket, clear_ticket
+import hashlib
+from typing import Optional, List, Tuple
+import gzip
+import logging
+from collections import deque, Counter
+import metrics
+from utils import (init_db, save_setup, load_setup, create_ticket_record, claim_ticket, get_ticket, archive_ticket,
+                   claim_denial, can_close, access_roles, discard_role,
+                   enqueue_log_event, pending_log_events, delete_log_events, record_transcript,
+                   get_overflow_categories, add_overflow_category, remove_overflow_category,
+                   get_ticket_stats, median_claim_bound, CLAIM_LATENCY_BUCKETS, search_tickets,
+                   find_unclaimed_tickets, find_tickets_created_before, list_open_tickets,
+                   warm_setup_cache, get_state, set_state, legacy_setup_channels, adopt_legacy_setup)
 
-# Initialize DB
-init_db()
+STARTED = time.perf_counter()
 
-# Load basic config (token + optional defaults)
+# Load basic config (token + optional defaults). The database is opened in
+# setup_hook, off the import path.
 with open("config.json", "r", encoding="utf-8") as f:
     CONFIG = json.load(f)
 
 TOKEN = CONFIG.get("token")
-if not TOKEN or TOKEN == "YOUR_BOT_TOKEN_HERE":
-    raise RuntimeError("Please set your bot token in config.json before running.")
+
+log = logging.getLogger("acrp")
 
 intents = discord.Intents.default()
 intents.members = True
 intents.message_content = False
+# Presence data is only needed to skip offline staff when auto-assigning
+intents.presences = bool(CONFIG.get("auto_assign", False) and CONFIG.get("auto_assign_online_only", False))
+
+# ---- Ticket log dispatcher ----
+LOG_BATCH_SIZE = 10  # Discord's limit of embeds per message
+LOG_MESSAGE_CHARS = 6000  # Discord's limit on total embed text per message
+LOG_FLUSH_INTERVAL = 2.0
+
+class LogDispatcher:
+    """Delivers ticket log embeds off the request path.
+
+    Events are persisted to the log_outbox table first, then sent by one
+    worker per logs channel (one Discord route bucket each), which coalesces
+    up to LOG_BATCH_SIZE embeds per message and flushes when a batch fills
+    or LOG_FLUSH_INTERVAL passes. Rows are deleted only once delivered, so
+    anything unsent is retried after a restart.
+    """
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self._queues = {}
+        self._wakeups = {}
+        self._workers = {}
+        self._restore_task = None
+
+    async def submit(self, channel_id: int, embed: discord.Embed):
+        data = embed.to_dict()
+        event_id = await enqueue_log_event(channel_id, data)
+        self._push(channel_id, event_id, data)
+
+    async def start(self):
+        # Read leftovers from a previous run before anything can be submitted
+        # (setup_hook runs before the gateway connects), so no event is
+        # queued twice
+        leftovers = await pending_log_events()
+        self._restore_task = asyncio.create_task(self.restore(leftovers))
+
+    async def restore(self, leftovers: list):
+        # Requeue the leftovers for channels we serve once the cache is ready
+        await self.bot.wait_until_ready()
+        for event_id, channel_id, data in leftovers:
+            if self.bot.get_channel(channel_id) is not None:
+                self._push(channel_id, event_id, data)
+
+    def pending(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def _push(self, channel_id: int, event_id: int, data: dict):
+        queue = self._queues.setdefault(channel_id, deque())
+        wakeup = self._wakeups.setdefault(channel_id, asyncio.Event())
+        queue.append((event_id, data))
+        if channel_id not in self._workers:
+            self._workers[channel_id] = asyncio.create_task(self._run(channel_id))
+        if len(queue) >= LOG_BATCH_SIZE:
+            wakeup.set()
+
+    async def _run(self, channel_id: int):
+        queue = self._queues[channel_id]
+        wakeup = self._wakeups[channel_id]
+        try:
+            await self.bot.wait_until_ready()
+            backoff = 1.0
+            while queue:
+                if len(queue) < LOG_BATCH_SIZE:
+                    try:
+                        await asyncio.wait_for(wakeup.wait(), LOG_FLUSH_INTERVAL)
+                    except asyncio.TimeoutError:
+                        pass
+                wakeup.clear()
+                batch, embeds, size = [], [], 0
+                while queue and len(batch) < LOG_BATCH_SIZE:
+                    embed = discord.Embed.from_dict(queue[0][1])
+                    # Discord also caps the combined text of a message's embeds
+                    if embeds and size + len(embed) > LOG_MESSAGE_CHARS:
+                        break
+                    batch.append(queue.popleft())
+                    embeds.append(embed)
+                    size += len(embed)
+                try:
+                    channel = self.bot.get_channel(channel_id)
+                    if channel is not None:
+                        await channel.send(embeds=embeds)
+                    else:
+                        log.warning("Logs channel %s not found; dropping %d log events", channel_id, len(batch))
+                except Exception as e:
+                    if isinstance(e, discord.HTTPException) and e.status != 429 and e.status < 500:
+                        log.error("Dropping %d log events for channel %s", len(batch), channel_id, exc_info=e)
+                    else:
+                        # Rate limits, server and network errors: put the batch
+                        # back and let the route recover
+                        log.warning("Log delivery to channel %s failed, retrying: %r", channel_id, e)
+                        queue.extendleft(reversed(batch))
+                        await asyncio.sleep(getattr(e, "retry_after", None) or backoff)
+                        backoff = min(backoff * 2, 60.0)
+                        continue
+                backoff = 1.0
+                try:
+                    await delete_log_events([event_id for event_id, _ in batch])
+                except Exception:
+                    # Delivered but left in the outbox; at worst resent after a restart
+                    log.exception("Could not clear %d delivered log events", len(batch))
+        finally:
+            # Always let _push start a fresh worker for this channel
+            del self._workers[channel_id]
+
+
+# ---- Transcript export ----
+TRANSCRIPT_DIR = "transcripts"
+TRANSCRIPT_CONCURRENCY = 2
+TRANSCRIPT_PAGE_SIZE = 100  # messages buffered between disk writes
+TRANSCRIPT_INDEX_CHARS = 100_000  # transcript text kept for /ticket_search
+
+def _message_record(message: discord.Message) -> dict:
+    return {
+        "id": message.id,
+        "author_id": message.author.id,
+        "author": str(message.author),
+        "created_at": message.created_at.isoformat(),
+        "content": message.content,
+        "attachments": [{"filename": a.filename, "url": a.url, "size": a.size} for a in message.attachments],
+        "embeds": [e.to_dict() for e in message.embeds],
+    }
+
+def _open_transcript(path: str):
+    raw = open(path, "wb")
+    return raw, gzip.GzipFile(fileobj=raw, mode="wb")
+
+def _write_transcript_lines(gz, lines):
+    gz.write("".join(lines).encode("utf-8"))
+
+def _commit_transcript(raw, gz, tmp_path: str, path: str):
+    # Durable before the rename, so a visible transcript is always complete
+    gz.close()
+    raw.flush()
+    os.fsync(raw.fileno())
+    raw.close()
+    os.replace(tmp_path, path)
+
+def _discard_transcript(raw, gz, tmp_path: str):
+    gz.close()
+    raw.close()
+    os.remove(tmp_path)
+
+class TranscriptExporter:
+    """Streams ticket history to gzipped JSONL files in TRANSCRIPT_DIR.
+
+    History is paged by channel.history and written TRANSCRIPT_PAGE_SIZE
+    messages at a time from a worker thread, so memory stays flat however
+    long the ticket is. At most TRANSCRIPT_CONCURRENCY exports run at once.
+    """
+
+    def __init__(self):
+        self._slots = asyncio.Semaphore(TRANSCRIPT_CONCURRENCY)
+        self._tasks = set()
+
+    def submit(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._done)
+        return task
+
+    def _done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        # Nothing awaits these tasks, so surface failures here
+        if not task.cancelled() and task.exception() is not None:
+            log.error("Background close task failed", exc_info=task.exception())
+
+    async def export(self, channel: discord.TextChannel):
+        async with self._slots:
+            os.makedirs(TRANSCRIPT_DIR, exist_ok=True)
+            path = os.path.join(TRANSCRIPT_DIR, f"{channel.guild.id}-{channel.id}.jsonl.gz")
+            tmp_path = path + ".part"
+            raw, gz = await asyncio.to_thread(_open_transcript, tmp_path)
+            count = 0
+            # Message text for the search index, capped so memory stays bounded
+            search_text, search_len = [], 0
+            try:
+                page = []
+                async for message in channel.history(limit=None, oldest_first=True):
+                    page.append(json.dumps(_message_record(message)) + "\n")
+                    if message.content and search_len < TRANSCRIPT_INDEX_CHARS:
+                        search_text.append(message.content[:TRANSCRIPT_INDEX_CHARS - search_len])
+                        search_len += len(search_text[-1]) + 1
+                    if len(page) >= TRANSCRIPT_PAGE_SIZE:
+                        await asyncio.to_thread(_write_transcript_lines, gz, page)
+                        count += len(page)
+                        page = []
+                if page:
+                    await asyncio.to_thread(_write_transcript_lines, gz, page)
+                    count += len(page)
+                await asyncio.to_thread(_commit_transcript, raw, gz, tmp_path, path)
+            except BaseException:
+                await asyncio.to_thread(_discard_transcript, raw, gz, tmp_path)
+                raise
+            return path, count, "\n".join(search_text)
+
+
+# ---- Ticket category sharding ----
+CATEGORY_CHANNEL_LIMIT = 50  # Discord's cap on channels per category
+CATEGORY_PRUNE_MINUTES = 5
+
+class CategoryManager:
+    """Spreads ticket channels over the configured category and overflow
+    categories created on demand.
+
+    Channel counts per category are seeded with one pass over the guild's
+    channels and then maintained from channel create/delete/update events,
+    plus in-flight reservations, so placing a ticket never scans the guild.
+    Channels the bot creates are counted from the REST result while their
+    reservation is still held; the gateway create event for them, which may
+    arrive before or after, is then a no-op.
+    """
+
+    def __init__(self):
+        self._counts = {}
+        self._pending = {}
+        self._sets = {}
+        # IDs of channels already counted, so each is counted exactly once
+        self._counted = set()
+        self._lock = asyncio.Lock()
+
+    def _load(self, guild: discord.Guild, base_id: int, overflow_ids: List[int]):
+        ids = [base_id] + [i for i in overflow_ids if isinstance(guild.get_channel(i), discord.CategoryChannel)]
+        self._sets[(guild.id, base_id)] = ids
+        for i in ids:
+            self._counts[i] = 0
+        for channel in guild.channels:
+            if channel.category_id in self._counts and channel.id not in self._counted:
+                self._counted.add(channel.id)
+                self._counts[channel.category_id] += 1
+
+    async def categories(self, guild: discord.Guild, base_id: int) -> List[int]:
+        key = (guild.id, base_id)
+        if key not in self._sets:
+            overflow_ids = await get_overflow_categories(guild.id, base_id)
+            if key not in self._sets:
+                self._load(guild, base_id, overflow_ids)
+        return self._sets[key]
+
+    def load(self, category_id: int) -> int:
+        return self._counts.get(category_id, 0) + self._pending.get(category_id, 0)
+
+    def track(self, category_id: Optional[int], delta: int):
+        if category_id in self._counts:
+            self._counts[category_id] += delta
+
+    def created(self, channel: discord.abc.GuildChannel):
+        # Called from both the REST result and the gateway event; counts once
+        if channel.category_id in self._counts and channel.id not in self._counted:
+            self._counted.add(channel.id)
+            self._counts[channel.category_id] += 1
+
+    def deleted(self, channel: discord.abc.GuildChannel):
+        self._counted.discard(channel.id)
+        self.track(channel.category_id, -1)
+
+    async def _place(self, guild: discord.Guild, base_id: int) -> Optional[discord.CategoryChannel]:
+        ids = await self.categories(guild, base_id)
+        base = guild.get_channel(base_id)
+        if not isinstance(base, discord.CategoryChannel):
+            return None
+        best = min(ids, key=self.load)
+        if self.load(best) < CATEGORY_CHANNEL_LIMIT:
+            return guild.get_channel(best)
+        async with self._lock:
+            # Another open may have created an overflow category while we waited
+            best = min(ids, key=self.load)
+            if self.load(best) < CATEGORY_CHANNEL_LIMIT:
+                return guild.get_channel(best)
+            category = await guild.create_category(f"{base.name} {len(ids) + 1}", overwrites=base.overwrites,
+                                                   position=base.position + len(ids), reason="Ticket category overflow")
+            await add_overflow_category(guild.id, base_id, category.id)
+            self._counts.setdefault(category.id, 0)
+            ids.append(category.id)
+            return category
+
+    @contextlib.asynccontextmanager
+    async def slot(self, guild: discord.Guild, base_id: Optional[int]):
+        # Yields the least-full category and holds a reservation in it while
+        # the caller creates a channel there and passes it to created()
+        category = await self._place(guild, base_id) if base_id else None
+        if category is None:
+            yield guild.get_channel(base_id) if base_id else None
+            return
+        self._pending[category.id] = self._pending.get(category.id, 0) + 1
+        try:
+            yield category
+        finally:
+            self._pending[category.id] -= 1
+
+    async def prune(self, guild: discord.Guild, base_id: int):
+        # Remove overflow categories that have emptied out
+        ids = self._sets.get((guild.id, base_id))
+        if not ids:
+            return
+        for category_id in ids[1:]:
+            if self.load(category_id) > 0:
+                continue
+            category = guild.get_channel(category_id)
+            ids.remove(category_id)
+            self._counts.pop(category_id, None)
+            await remove_overflow_category(category_id)
+            if category is not None:
+                await category.delete(reason="Empty ticket overflow category")
+
+
+# ---- Warm channel pool ----
+# Channels created ahead of time under the ticket category, one pool per ticket
+# type, visible to the bot only. Opening a ticket then only needs one edit that
+# renames it and applies the current staff overwrites plus the author's.
+POOL_SIZE = int(CONFIG.get("ticket_pool_size", 2))
+POOL_REFILL_SECONDS = int(CONFIG.get("ticket_pool_refill_seconds", 30))
+POOL_PREFIX = "ticket-pool-"
+TICKET_TYPES = ("general", "community")
+
+def ticket_overwrites(guild: discord.Guild, cfg: dict, ttype: str) -> dict:
+    overwrites = {
+        guild.default_role: discord.PermissionOverwrite(view_channel=False),
+    }
+    # Staff roles specified in gsaccess/csaccess should get view access
+    role_ids = cfg["gsaccess"] if ttype == "general" else cfg["csaccess"]
+    # Add each role with view permissions, but skip LOA role members (LOA is a role id which we won't give pings to, but still giving role view permission is fine)
+    for rid in role_ids:
+        role = guild.get_role(rid)
+        if role:
+            overwrites[role] = discord.PermissionOverwrite(view_channel=True, send_messages=True)
+    return overwrites
+
+def pool_overwrites(guild: discord.Guild) -> dict:
+    # Nothing config-dependent, so a pooled channel never goes stale
+    return {
+        guild.default_role: discord.PermissionOverwrite(view_channel=False),
+        guild.me: discord.PermissionOverwrite(view_channel=True),
+    }
+
+class ChannelPool:
+    def __init__(self, size: int):
+        self.size = size
+        # guild_id -> count
+        self.hits = Counter()
+        self.misses = Counter()
+        self._pools = {}
+        self._discovered = set()
+
+    def _pool(self, guild_id: int, ttype: str) -> deque:
+        return self._pools.setdefault((guild_id, ttype), deque())
+
+    def ready(self, guild_id: int) -> dict:
+        return {ttype: len(self._pools.get((guild_id, ttype), ())) for ttype in TICKET_TYPES}
+
+    def acquire(self, guild: discord.Guild, category_ids: List[int], ttype: str) -> Optional[discord.TextChannel]:
+        # Synchronous pop, so two concurrent opens never get the same channel
+        pool = self._pools.get((guild.id, ttype))
+        while pool:
+            channel = guild.get_channel(pool.popleft())
+            if channel is not None and channel.category_id in category_ids:
+                self.hits[guild.id] += 1
+                return channel
+        self.misses[guild.id] += 1
+        return None
+
+    def reset(self, guild: discord.Guild) -> List[discord.TextChannel]:
+        # Ticket category changed: hand the pooled channels back for deletion
+        stale = []
+        for ttype in TICKET_TYPES:
+            pool = self._pools.pop((guild.id, ttype), ())
+            stale.extend(c for c in map(guild.get_channel, pool) if c is not None)
+        return stale
+
+    def _discover(self, guild: discord.Guild, category_ids: List[int]):
+        # Re-adopt pool channels left from a previous run (once per guild)
+        for channel in guild.text_channels:
+            if channel.category_id in category_ids and channel.name.startswith(POOL_PREFIX):
+                ttype = channel.name[len(POOL_PREFIX):]
+                if ttype in TICKET_TYPES:
+                    self._pool(guild.id, ttype).append(channel.id)
+        self._discovered.add(guild.id)
 
-bot = commands.Bot(command_prefix="!", intents=intents)
+    async def refill(self, guild: discord.Guild, cfg: dict, categories: CategoryManager):
+        if not isinstance(guild.get_channel(cfg["category_id"]), discord.CategoryChannel):
+            return
+        if guild.id not in self._discovered:
+            self._discover(guild, await categories.categories(guild, cfg["category_id"]))
+        for ttype in TICKET_TYPES:
+            pool = self._pool(guild.id, ttype)
+            while len(pool) < self.size:
+                async with categories.slot(guild, cfg["category_id"]) as category:
+                    channel = await guild.create_text_channel(POOL_PREFIX + ttype, overwrites=pool_overwrites(guild),
+                                                              category=category, reason="Pre-created ticket channel")
+                    categories.created(channel)
+                pool.append(channel.id)
+
+
+# ---- Auto-assignment ----
+AUTO_ASSIGN = bool(CONFIG.get("auto_assign", False))
+AUTO_ASSIGN_ONLINE_ONLY = bool(CONFIG.get("auto_assign_online_only", False))
+
+class StaffScheduler:
+    """Least-loaded staff picker for auto-assigned tickets.
+
+    Per guild and ticket type it keeps the set of eligible staff (access role,
+    not LOA) and a min-heap of (open claims, member ID). Heap entries are
+    invalidated lazily: when a member's load or eligibility changes a fresh
+    entry is pushed and outdated ones are skipped on pop, so picking and
+    updating are both O(log n).
+    """
+
+    def __init__(self, online_only: bool = False):
+        self.online_only = online_only
+        self._loads = {}
+        self._eligible = {}
+        self._heaps = {}
+
+    async def ensure(self, guild: discord.Guild, cfg: dict):
+        if (guild.id, TICKET_TYPES[0]) in self._eligible:
+            return
+        stats = await get_ticket_stats(guild.id)
+        for name, value in stats.items():
+            if name.startswith("staff_open:"):
+                self._loads[(guild.id, int(name.split(":", 1)[1]))] = max(0, value)
+        for ttype in TICKET_TYPES:
+            members = set()
+            for rid in access_roles(cfg, ttype):
+                role = guild.get_role(rid)
+                if role is not None:
+                    members.update(m.id for m in role.members if not m.bot and cfg["loa_roles"].isdisjoint(member_role_ids(m)))
+            self._eligible[(guild.id, ttype)] = members
+            self._rebuild(guild.id, ttype)
+
+    def _rebuild(self, guild_id: int, ttype: str):
+        heap = [(self._loads.get((guild_id, mid), 0), mid) for mid in self._eligible[(guild_id, ttype)]]
+        heapq.heapify(heap)
+        self._heaps[(guild_id, ttype)] = heap
+
+    def _push(self, guild_id: int, ttype: str, member_id: int):
+        heap = self._heaps[(guild_id, ttype)]
+        heapq.heappush(heap, (self._loads.get((guild_id, member_id), 0), member_id))
+        # Compact once outdated entries dominate
+        if len(heap) > 4 * len(self._eligible[(guild_id, ttype)]) + 16:
+            self._rebuild(guild_id, ttype)
+
+    async def eligible(self, guild: discord.Guild, cfg: dict, ttype: str) -> frozenset:
+        # IDs of staff with the type's access role who are not on LOA
+        await self.ensure(guild, cfg)
+        return frozenset(self._eligible.get((guild.id, ttype), ()))
+
+    def reset(self, guild_id: int):
+        for ttype in TICKET_TYPES:
+            self._eligible.pop((guild_id, ttype), None)
+            self._heaps.pop((guild_id, ttype), None)
+
+    def refresh_member(self, member: discord.Member, cfg: dict):
+        # Re-evaluate eligibility after a role change
+        role_ids = member_role_ids(member)
+        for ttype in TICKET_TYPES:
+            eligible = self._eligible.get((member.guild.id, ttype))
+            if eligible is None:
+                continue
+            if not member.bot and claim_denial(cfg, role_ids, ttype) is None:
+                if member.id not in eligible:
+                    eligible.add(member.id)
+                    self._push(member.guild.id, ttype, member.id)
+            else:
+                eligible.discard(member.id)
+
+    def adjust(self, guild_id: int, member_id: int, delta: int):
+        key = (guild_id, member_id)
+        self._loads[key] = max(0, self._loads.get(key, 0) + delta)
+        for ttype in TICKET_TYPES:
+            if member_id in self._eligible.get((guild_id, ttype), ()):
+                self._push(guild_id, ttype, member_id)
+
+    def pick(self, guild: discord.Guild, ttype: str) -> Optional[discord.Member]:
+        heap = self._heaps.get((guild.id, ttype))
+        eligible = self._eligible.get((guild.id, ttype), ())
+        skipped = []
+        chosen = None
+        while heap:
+            load, mid = heapq.heappop(heap)
+            if mid not in eligible or load != self._loads.get((guild.id, mid), 0):
+                continue  # outdated entry
+            member = guild.get_member(mid)
+            if member is None:
+                continue
+            if self.online_only and member.status is discord.Status.offline:
+                skipped.append((load, mid))
+                continue
+            chosen = member
+            heapq.heappush(heap, (load, mid))
+            break
+        for entry in skipped:
+            heapq.heappush(heap, entry)
+        return chosen
+
+# ---- Metrics ----
+# Served as Prometheus text on http://METRICS_HOST:METRICS_PORT/metrics and
+# summarized by /bot_health. Processes sharing a host need their own port
+# (metrics_port in config.json or ACRP_METRICS_PORT); 0 turns it off.
+METRICS_HOST = CONFIG.get("metrics_host", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("ACRP_METRICS_PORT") or CONFIG.get("metrics_port", 9108) or 0)
+
+class ACRPCommandTree(app_commands.CommandTree):
+    # Stamps every slash command so its handling time can be recorded when
+    # it completes (see record_command_completion) or fails
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        interaction.extras["acrp_started"] = time.perf_counter()
+        return True
+
+    async def on_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
+        record_command_time(interaction, "error")
+        await super().on_error(interaction, error)
+
+def record_command_time(interaction: discord.Interaction, outcome: str):
+    started = interaction.extras.get("acrp_started")
+    if started is not None and interaction.command is not None:
+        metrics.observe("acrp_command_seconds", time.perf_counter() - started,
+                        command=interaction.command.qualified_name, outcome=outcome)
+
+
+class ACRPBot(commands.AutoShardedBot):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, tree_cls=ACRPCommandTree, http_trace=metrics.http_trace(), **kwargs)
+        self.log_dispatcher = LogDispatcher(self)
+        self.transcripts = TranscriptExporter()
+        self.channel_pool = ChannelPool(POOL_SIZE)
+        self.categories = CategoryManager()
+        self.scheduler = StaffScheduler(AUTO_ASSIGN_ONLINE_ONLY)
+        self.metrics_server = None
+        self._lag_watcher = None
+        # Startup stage -> milliseconds, reported on the first on_ready
+        self.startup_stages = {}
+        self._ready_once = False
+        self._shard_disconnects = {}
+
+    async def setup_hook(self):
+        # Runs once per process, after login and before the gateway connects,
+        # so caches are warm before the first interaction arrives
+        stages = self.startup_stages
+        await _timed(stages, "database", asyncio.to_thread(init_db))
+        await _timed(stages, "config_cache", warm_setup_cache())
+        await _timed(stages, "open_tickets", load_open_tickets())
+        # Re-attach persistent components so old dropdowns survive restarts
+        self.add_view(TicketOpenView())
+        self.add_dynamic_items(ClaimSelect)
+        await _timed(stages, "command_sync", sync_commands())
+        await self.log_dispatcher.start()
+        if self.channel_pool.size > 0:
+            refill_channel_pool.start()
+        prune_ticket_categories.start()
+        sweep_stale_tickets.start()
+        self._lag_watcher = asyncio.create_task(metrics.watch_loop_lag())
+        if METRICS_PORT:
+            try:
+                self.metrics_server = await metrics.serve(METRICS_HOST, METRICS_PORT)
+            except OSError as e:
+                log.warning("Metrics endpoint not started on %s:%s: %s", METRICS_HOST, METRICS_PORT, e)
+
+    async def close(self):
+        if self._lag_watcher is not None:
+            self._lag_watcher.cancel()
+        if self.metrics_server is not None:
+            await self.metrics_server.cleanup()
+        await super().close()
+
+# Sharding: by default Discord picks the shard count and this process runs all
+# shards. To split shards across processes, give every process the same
+# shard_count and its own shard_ids (config.json or ACRP_SHARD_COUNT /
+# ACRP_SHARD_IDS="0,1"); they can share the same database file.
+SHARD_COUNT = os.environ.get("ACRP_SHARD_COUNT") or CONFIG.get("shard_count")
+SHARD_IDS = os.environ.get("ACRP_SHARD_IDS") or CONFIG.get("shard_ids")
+if isinstance(SHARD_IDS, str):
+    SHARD_IDS = [int(p) for p in SHARD_IDS.split(",") if p.strip()]
+
+bot = ACRPBot(command_prefix="!", intents=intents,
+              shard_count=int(SHARD_COUNT) if SHARD_COUNT else None,
+              shard_ids=SHARD_IDS or None)
 tree = bot.tree
 
+def member_role_ids(member: discord.Member) -> frozenset:
+    # Built per check: interaction payloads carry the member's current roles,
+    # so a cache could only be staler (e.g. across a non-resumed reconnect)
+    return frozenset(r.id for r in member.roles)
+
 # The six professional responses EXACTLY as requested
 PROFESSIONAL_PHRASES = [
     "Your professional response to this ticket would be greatly appreciated.",
@@ -52,6 +646,330 @@ def build_public_ticket_embed(ticket_type: str, user: discord.Member, issue_text
     embed.add_field(name="\u200b", value="Click the dropdown embed below to claim this ticket, and if it is already claimed, you cannot access it unless you are added to that ticket by a staff member or Internal Affairs+", inline=False)
     return embed
 
+async def _timed(stages: dict, name: str, aw):
+    # Await aw and record how long it took in stages[name] (milliseconds)
+    start = time.perf_counter()
+    try:
+        return await aw
+    finally:
+        stages[name] = (time.perf_counter() - start) * 1000
+
+# Channel ID -> claimer for tickets claimed (or being claimed) through this
+# process. It is checked and set with no await in between, so simultaneous
+# clicks are serialized without a lock and losers are answered without a DB
+# round trip or any ticket-channel API calls. The DB compare-and-set in
+# claim_ticket() remains the source of truth across processes.
+_claims = {}
+# Ticket channels with a close in progress
+_closing = set()
+
+def build_already_claimed_embed(claimer_id: int) -> discord.Embed:
+    embed_already = discord.Embed(title="Ticket Already Claimed", description="This ticket is already claimed.", color=discord.Color.red())
+    embed_already.add_field(name="Claimed by", value=f"<@{claimer_id}>", inline=False)
+    return embed_already
+
+async def claim_ticket_channel(interaction: discord.Interaction, ticket_channel: discord.TextChannel, ttype: str, log_claim: bool = False):
+    # Shared claim path for /claim and the claim dropdown
+    cfg = await load_setup(interaction.guild.id)
+    # Only staff roles may claim — check role lists
+    denial = claim_denial(cfg, member_role_ids(interaction.user), ttype)
+    if denial == "loa":
+        # LOA role prevents pings/participation - disallow claiming
+        await interaction.response.send_message("You are marked LOA and cannot claim tickets.", ephemeral=True)
+        return
+    if denial:
+        await interaction.response.send_message("You do not have permission to claim this ticket.", ephemeral=True)
+        return
+    won, claimer_id = await claim_for(interaction.user, ticket_channel, cfg, log_claim)
+    if won:
+        # send ephemeral confirmation to claimer
+        await interaction.response.send_message("You have successfully claimed the ticket.", ephemeral=True)
+    elif claimer_id is None:
+        await interaction.response.send_message("This ticket no longer exists.", ephemeral=True)
+    else:
+        await interaction.response.send_message(embed=build_already_claimed_embed(claimer_id), ephemeral=True)
+
+async def claim_for(member: discord.Member, ticket_channel: discord.TextChannel, cfg: dict, log_claim: bool = False) -> Tuple[bool, Optional[int]]:
+    # Claims the ticket for member and applies the Discord side effects if it
+    # won. Returns (won, current claimer); permission checks are the caller's.
+    claimer_id = _claims.get(ticket_channel.id)
+    if claimer_id is not None:
+        return False, claimer_id
+    # reserve locally, then confirm with the DB
+    _claims[ticket_channel.id] = member.id
+    try:
+        won, claimer_id = await claim_ticket(ticket_channel.id, member.id)
+    except Exception:
+        _claims.pop(ticket_channel.id, None)
+        raise
+    if not won:
+        if claimer_id is None:
+            _claims.pop(ticket_channel.id, None)
+        else:
+            _claims[ticket_channel.id] = claimer_id
+        return False, claimer_id
+    bot.scheduler.adjust(member.guild.id, member.id, 1)
+    # grant claimant access to the ticket channel (if they don't already have)
+    await ticket_channel.set_permissions(member, view_channel=True, send_messages=True)
+    # send a private embed message inside the ticket channel to indicate claim
+    embed_claim = discord.Embed(title="Ticket Claimed", description=f"This ticket has been claimed by <@{member.id}>", color=discord.Color.gold())
+    await ticket_channel.send(embed=embed_claim)
+    # log claim in ticket logs channel if configured
+    if log_claim:
+        if cfg["ticket_logs_channel_id"]:
+            log_embed = discord.Embed(title="Ticket Claimed", description=f"Ticket {ticket_channel.mention} claimed by <@{member.id}>", color=discord.Color.dark_gray())
+            await bot.log_dispatcher.submit(cfg["ticket_logs_channel_id"], log_embed)
+    return True, member.id
+
+async def auto_assign(guild: discord.Guild, ticket_channel: discord.TextChannel, ttype: str, cfg: dict):
+    # Hand a new ticket to the least-loaded eligible staff member through the normal claim path
+    await bot.scheduler.ensure(guild, cfg)
+    member = bot.scheduler.pick(guild, ttype)
+    if member is None:
+        return
+    try:
+        await claim_for(member, ticket_channel, cfg, log_claim=True)
+    except discord.HTTPException:
+        log.exception("Auto-assigning ticket %s to %s failed", ticket_channel.id, member.id)
+
+# ---- Ticket admission control ----
+# One open ticket per (guild, user, type), plus token buckets limiting how
+# often a user, and a guild as a whole, may open tickets.
+TICKET_OPEN_USER_BURST = int(CONFIG.get("ticket_open_user_burst", 2))
+TICKET_OPEN_USER_REFILL_SECONDS = float(CONFIG.get("ticket_open_user_refill_seconds", 300))
+TICKET_OPEN_GUILD_BURST = int(CONFIG.get("ticket_open_guild_burst", 10))
+TICKET_OPEN_GUILD_REFILL_SECONDS = float(CONFIG.get("ticket_open_guild_refill_seconds", 6))
+
+class TokenBucket:
+    def __init__(self, capacity: int, refill_seconds: float):
+        self.capacity = capacity
+        self.refill_seconds = refill_seconds
+        self._state = {}
+
+    def _tokens(self, key, now: float) -> float:
+        tokens, updated = self._state.get(key, (self.capacity, now))
+        return min(self.capacity, tokens + (now - updated) / self.refill_seconds)
+
+    def wait_time(self, key) -> float:
+        # Seconds until a token is available (0 if one is available now)
+        tokens = self._tokens(key, time.monotonic())
+        return 0.0 if tokens >= 1 else (1 - tokens) * self.refill_seconds
+
+    def take(self, key):
+        now = time.monotonic()
+        self._state[key] = (self._tokens(key, now) - 1, now)
+        if len(self._state) > 10000:
+            # Full buckets carry no information
+            for k in [k for k in self._state if self._tokens(k, now) >= self.capacity]:
+                del self._state[k]
+
+# (guild_id, author_id, type) -> ticket channel ID; 0 while the channel is
+# being created. Seeded from the tickets table in setup_hook.
+_open_tickets = {}
+_user_opens = TokenBucket(TICKET_OPEN_USER_BURST, TICKET_OPEN_USER_REFILL_SECONDS)
+_guild_opens = TokenBucket(TICKET_OPEN_GUILD_BURST, TICKET_OPEN_GUILD_REFILL_SECONDS)
+
+def admission_rejection(key: tuple, consume: bool = True) -> Optional[str]:
+    # Returns the message to send back, or None if the open may proceed
+    guild_id, user_id, ttype = key
+    existing = _open_tickets.get(key)
+    if existing == 0:
+        return "Your ticket is already being created."
+    if existing is not None:
+        guild = bot.get_guild(guild_id)
+        if guild is None or guild.get_channel(existing) is not None:
+            return f"You already have an open {ttype.capitalize()} Support ticket: <#{existing}>"
+        # The channel was deleted without /close_ticket; its row is archived
+        # by on_guild_channel_delete or the stale sweeper
+        del _open_tickets[key]
+    wait = _user_opens.wait_time((guild_id, user_id))
+    if wait:
+        return f"You're opening tickets too quickly. Please try again in {int(wait) + 1} seconds."
+    wait = _guild_opens.wait_time(guild_id)
+    if wait:
+        return f"Too many tickets are being opened right now. Please try again in {int(wait) + 1} seconds."
+    if consume:
+        _user_opens.take((guild_id, user_id))
+        _guild_opens.take(guild_id)
+    return None
+
+async def load_open_tickets():
+    for channel_id, guild_id, author_id, ttype, claimed_by in await list_open_tickets():
+        _open_tickets[(guild_id, author_id, ttype)] = channel_id
+        # Claims made before a restart, for the health gauges and /claim's fast path
+        if claimed_by is not None:
+            _claims[channel_id] = claimed_by
+
+# ---- Persistent ticket components ----
+# Every message component carries a fixed or templated custom_id and is
+# registered once in setup_hook, so dropdowns posted before a restart keep
+# working and no per-ticket classes or views are kept in memory. Modals are
+# the exception: each form is its own short-lived instance.
+
+class IssueModal(discord.ui.Modal, title="Open Ticket"):
+    issue = discord.ui.TextInput(label="Issue description", style=discord.TextStyle.long, placeholder="Describe the issue you need help with", required=True, max_length=2000)
+
+    def __init__(self, choice: str):
+        # Random per-instance custom_id (the default): discord.py keeps modals
+        # by custom_id, so a shared one would let forms replace each other
+        super().__init__()
+        self.choice = choice
+
+    @metrics.timed("acrp_component_seconds", component="issue_modal")
+    async def on_submit(self, modal_interaction: discord.Interaction):
+        # Read the submitted text before any await
+        issue_text = self.issue.value
+        # Dedupe and rate-limit before any channel work
+        key = (modal_interaction.guild.id, modal_interaction.user.id, self.choice)
+        rejection = admission_rejection(key)
+        if rejection:
+            await modal_interaction.response.send_message(rejection, ephemeral=True)
+            return
+        _open_tickets[key] = 0
+        try:
+            await self._open(modal_interaction, key, issue_text)
+        finally:
+            if _open_tickets.get(key) == 0:
+                _open_tickets.pop(key, None)
+
+    async def _open(self, modal_interaction: discord.Interaction, key: tuple, issue_text: str):
+        choice = self.choice
+        stages = {}
+        started = time.perf_counter()
+        # Acknowledge within Discord's 3-second window before any slow work
+        await _timed(stages, "defer", modal_interaction.response.defer(ephemeral=True, thinking=True))
+        guild = modal_interaction.guild
+        cfg = await load_setup(guild.id)
+        # Create channel name
+        safe_name = f"ticket-{modal_interaction.user.name}".lower()
+        author_overwrite = discord.PermissionOverwrite(view_channel=True, send_messages=True)
+        category_ids = await bot.categories.categories(guild, cfg["category_id"]) if cfg["category_id"] else []
+        overwrites = ticket_overwrites(guild, cfg, choice)
+        overwrites[modal_interaction.user] = author_overwrite
+        ticket_channel = bot.channel_pool.acquire(guild, category_ids, choice)
+        try:
+            if ticket_channel is not None:
+                # Pre-created channel is hidden; rename it and open it up to staff and the author
+                await _timed(stages, "pool_claim", ticket_channel.edit(name=safe_name, overwrites=overwrites, reason="New support ticket created via ACRP Utilities"))
+            else:
+                # create a private channel in the least-full ticket category with appropriate permissions
+                async with bot.categories.slot(guild, cfg["category_id"]) as category:
+                    ticket_channel = await _timed(stages, "create_channel", guild.create_text_channel(safe_name, overwrites=overwrites, category=category, reason="New support ticket created via ACRP Utilities"))
+                    bot.categories.created(ticket_channel)
+        except discord.HTTPException:
+            # Full category, missing permissions, ... (a failed pool channel is
+            # left out of the pool and its leftover is re-adopted on restart)
+            log.exception("Creating a %s ticket channel in guild %s failed", choice, guild.id)
+            await modal_interaction.followup.send("Your ticket couldn't be created. Please try again later or contact staff.", ephemeral=True)
+            return
+
+        _open_tickets[key] = ticket_channel.id
+
+        # Everything below only depends on the channel existing, so run it concurrently
+        embed_ticket = discord.Embed(title=f"Ticket — {choice.capitalize()}",
+                                     description=f"Ticket created by <@{modal_interaction.user.id}>",
+                                     color=discord.Color.blue())
+        embed_ticket.add_field(name="User", value=f"<@{modal_interaction.user.id}>", inline=False)
+        embed_ticket.add_field(name="Issue", value=issue_text, inline=False)
+        embed_ticket.add_field(name="Status", value="Open", inline=False)
+        steps = [
+            _timed(stages, "db_write", create_ticket_record(guild.id, ticket_channel.id, modal_interaction.user.id, choice, issue_text, int(time.time()))),
+            # Send ticket embed inside ticket channel (visible to authorized roles + author)
+            _timed(stages, "ticket_embed", ticket_channel.send(embed=embed_ticket)),
+        ]
+        # Post public embed in the appropriate requests channel (public notification)
+        if choice == "general":
+            public_ch = guild.get_channel(cfg["general_requests_channel_id"])
+        else:
+            public_ch = guild.get_channel(cfg["community_requests_channel_id"])
+        if public_ch:
+            public_embed = build_public_ticket_embed(choice, modal_interaction.user, issue_text)
+            # send public embed with a claim dropdown for staff
+            view = discord.ui.View(timeout=None)
+            view.add_item(ClaimSelect(ticket_channel.id, choice))
+            steps.append(_timed(stages, "public_embed", public_ch.send(embed=public_embed, view=view)))
+        results = await asyncio.gather(*steps, return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                log.error("Ticket %s open step failed", ticket_channel.id, exc_info=result)
+        if isinstance(results[0], BaseException):
+            # No ticket row: nothing could claim, close or archive this channel,
+            # so undo the open rather than hand the user an orphan
+            _open_tickets.pop(key, None)
+            await self._abandon(ticket_channel, results[2] if len(results) > 2 else None)
+            await modal_interaction.followup.send("Your ticket couldn't be created. Please try again later or contact staff.", ephemeral=True)
+            return
+
+        # Respond to the modal submitter ephemeral confirmation
+        await _timed(stages, "followup", modal_interaction.followup.send(f"Your ticket has been created: {ticket_channel.mention}", ephemeral=True))
+        log.info("Ticket %s opened in %.0fms (%s)", ticket_channel.id, (time.perf_counter() - started) * 1000,
+                 ", ".join(f"{name}={ms:.0f}ms" for name, ms in stages.items()))
+        if AUTO_ASSIGN:
+            await auto_assign(guild, ticket_channel, choice, cfg)
+
+    @staticmethod
+    async def _abandon(ticket_channel: discord.TextChannel, public_message):
+        if isinstance(public_message, discord.Message):
+            with contextlib.suppress(discord.HTTPException):
+                await public_message.delete()
+        try:
+            await ticket_channel.delete(reason="Ticket could not be recorded")
+        except discord.HTTPException:
+            log.exception("Removing unrecorded ticket channel %s failed", ticket_channel.id)
+
+
+class TicketSelect(discord.ui.Select):
+    def __init__(self):
+        options = [
+            discord.SelectOption(label="Open General Support Ticket", value="general", description="Create a General Support ticket."),
+            discord.SelectOption(label="Open Community Support Ticket", value="community", description="Create a Community/HR Support ticket.")
+        ]
+        super().__init__(custom_id="acrp:ticket_open", placeholder="Create a ticket...", min_values=1, max_values=1, options=options)
+
+    @metrics.timed("acrp_component_seconds", component="ticket_select")
+    async def callback(self, interaction: discord.Interaction):
+        # Turn away duplicates before showing the form; the submit re-checks
+        rejection = admission_rejection((interaction.guild.id, interaction.user.id, self.values[0]), consume=False)
+        if rejection:
+            await interaction.response.send_message(rejection, ephemeral=True)
+            return
+        # open a modal to collect issue description
+        await interaction.response.send_modal(IssueModal(self.values[0]))
+
+
+class TicketOpenView(discord.ui.View):
+    # One shared instance is registered with bot.add_view
+    def __init__(self):
+        super().__init__(timeout=None)
+        self.add_item(TicketSelect())
+
+
+class ClaimSelect(discord.ui.DynamicItem[discord.ui.Select], template=r"acrp:claim:(?P<ttype>general|community):(?P<channel_id>[0-9]+)"):
+    # The ticket channel and type live in the custom_id, e.g. acrp:claim:general:1234
+    def __init__(self, channel_id: int, ttype: str):
+        super().__init__(discord.ui.Select(
+            custom_id=f"acrp:claim:{ttype}:{channel_id}",
+            placeholder="Claim this ticket...",
+            min_values=1,
+            max_values=1,
+            options=[discord.SelectOption(label="Claim this ticket", value=str(channel_id))]
+        ))
+        self.channel_id = channel_id
+        self.ttype = ttype
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Select, match):
+        return cls(int(match["channel_id"]), match["ttype"])
+
+    @metrics.timed("acrp_component_seconds", component="claim_select")
+    async def callback(self, select_interaction: discord.Interaction):
+        guild = select_interaction.guild
+        ticket_channel = guild.get_channel(self.channel_id)
+        if ticket_channel is None:
+            await select_interaction.response.send_message("This ticket no longer exists.", ephemeral=True)
+            return
+        await claim_ticket_channel(select_interaction, ticket_channel, self.ttype, log_claim=True)
+
 # Setup command: stores configuration in the DB.
 # This implements every attribute you requested: [Assistance Channel], [General Support Requests], [Community Support Requests], [GSAccess], [CSAccess], [LOA Role ID], [ticket logs channel id]
 @tree.command(name="setup_support", description="Configure the ACRP Utilities Support System fully.")
@@ -90,128 +1008,30 @@ async def setup_support(interaction: discord.Interaction,
 
     gs_list = parse_role_list(gsaccess)
     cs_list = parse_role_list(csaccess)
+    previous = await load_setup(interaction.guild.id)
 
-    save_setup(assistance_channel_id, general_requests_channel_id, community_requests_channel_id,
+    await save_setup(interaction.guild.id, assistance_channel_id, general_requests_channel_id, community_requests_channel_id,
                gs_list, cs_list, loa_role_id, ticket_logs_channel_id, category_id)
 
     # confirm to the invoker with ephemeral message (private flagged)
     await interaction.response.send_message("Support system configuration saved successfully.", ephemeral=True)
 
+    bot.scheduler.reset(interaction.guild.id)
+    # Pooled channels carry no staff overwrites, so only a category move strands them
+    if previous["category_id"] != category_id:
+        for stale in bot.channel_pool.reset(interaction.guild):
+            try:
+                await stale.delete(reason="Ticket category changed")
+            except discord.HTTPException:
+                pass
+
     # After saving, attempt to post a dropdown message in the assistance channel describing how to open tickets.
-    cfg = load_setup()
+    cfg = await load_setup(interaction.guild.id)
     ass_ch = interaction.guild.get_channel(cfg["assistance_channel_id"]) if cfg["assistance_channel_id"] else None
     if ass_ch:
         embed = discord.Embed(title="Support System: Ticket Creation", description="Use the dropdown below to create a new ticket. Choose General Support or Community Support and provide your issue when prompted.", color=discord.Color.green())
-        # We'll send a message with a select menu to open a ticket
-        class TicketSelect(discord.ui.Select):
-            def __init__(self):
-                options = [
-                    discord.SelectOption(label="Open General Support Ticket", value="general", description="Create a General Support ticket."),
-                    discord.SelectOption(label="Open Community Support Ticket", value="community", description="Create a Community/HR Support ticket.")
-                ]
-                super().__init__(placeholder="Create a ticket...", min_values=1, max_values=1, options=options)
-
-            async def callback(self, interaction: discord.Interaction):
-                choice = self.values[0]
-                # open a modal to collect issue description
-                class IssueModal(discord.ui.Modal, title="Open Ticket"):
-                    issue = discord.ui.TextInput(label="Issue description", style=discord.TextStyle.long, placeholder="Describe the issue you need help with", required=True, max_length=2000)
-
-                    async def on_submit(self, modal_interaction: discord.Interaction):
-                        # create ticket channel
-                        cfg = load_setup()
-                        guild = modal_interaction.guild
-                        category = guild.get_channel(cfg["category_id"]) if cfg["category_id"] else None
-                        # create a private channel under category with appropriate permissions
-                        overwrites = {
-                            guild.default_role: discord.PermissionOverwrite(view_channel=False),
-                            modal_interaction.user: discord.PermissionOverwrite(view_channel=True, send_messages=True),
-                        }
-                        # Staff roles specified in gsaccess/csaccess should get view access
-                        role_ids = cfg["gsaccess"] if choice == "general" else cfg["csaccess"]
-                        # Add each role with view permissions, but skip LOA role members (LOA is a role id which we won't give pings to, but still giving role view permission is fine)
-                        for rid in role_ids:
-                            role = guild.get_role(rid)
-                            if role:
-                                overwrites[role] = discord.PermissionOverwrite(view_channel=True, send_messages=True)
-                        # Create channel name
-                        safe_name = f"ticket-{modal_interaction.user.name}".lower()
-                        ticket_channel = await guild.create_text_channel(safe_name, overwrites=overwrites, category=category, reason="New support ticket created via ACRP Utilities")
-                        # Save ticket record
-                        create_ticket_record(ticket_channel.id, modal_interaction.user.id, choice, self.issue.value, int(time.time()))
-                        # Send ticket embed inside ticket channel (visible to authorized roles + author)
-                        embed_ticket = discord.Embed(title=f"Ticket — {choice.capitalize()}",
-                                                     description=f"Ticket created by <@{modal_interaction.user.id}>",
-                                                     color=discord.Color.blue())
-                        embed_ticket.add_field(name="User", value=f"<@{modal_interaction.user.id}>", inline=False)
-                        embed_ticket.add_field(name="Issue", value=self.issue.value, inline=False)
-                        embed_ticket.add_field(name="Status", value="Open", inline=False)
-                        await ticket_channel.send(embed=embed_ticket)
-                        # Post public embed in the appropriate requests channel (public notification)
-                        if choice == "general":
-                            public_ch = guild.get_channel(cfg["general_requests_channel_id"])
-                        else:
-                            public_ch = guild.get_channel(cfg["community_requests_channel_id"])
-                        if public_ch:
-                            public_embed = build_public_ticket_embed(choice, modal_interaction.user, self.issue.value)
-                            # send public embed and include a view with a claim select for staff
-                            # We'll send a message with a dropdown that allows staff to claim
-                            class ClaimSelect(discord.ui.Select):
-                                def __init__(self):
-                                    options = [discord.SelectOption(label="Claim this ticket", value=str(ticket_channel.id))]
-                                    super().__init__(placeholder="Claim this ticket...", min_values=1, max_values=1, options=options)
-
-                                async def callback(self, select_interaction: discord.Interaction):
-                                    # Only staff roles may claim — check role lists
-                                    cfg = load_setup()
-                                    allowed_role_ids = cfg["gsaccess"] if choice == "general" else cfg["csaccess"]
-                                    member_roles = [r.id for r in select_interaction.user.roles]
-                                    # Check if user has LOA role
-                                    loa = cfg.get("loa_role_id")
-                                    if loa and loa in member_roles:
-                                        # LOA role prevents pings/participation - disallow claiming
-                                        await select_interaction.response.send_message("You are marked LOA and cannot claim tickets.", ephemeral=True)
-                                        return
-                                    if not any(rid in member_roles for rid in allowed_role_ids):
-                                        await select_interaction.response.send_message("You do not have permission to claim this ticket.", ephemeral=True)
-                                        return
-                                    # check if already claimed
-                                    ticket = get_ticket(ticket_channel.id)
-                                    if ticket and ticket.get("claimed_by"):
-                                        # Already claimed
-                                        claimer_id = ticket["claimed_by"]
-                                        embed_already = discord.Embed(title="Ticket Already Claimed", description="This ticket is already claimed.", color=discord.Color.red())
-                                        embed_already.add_field(name="Claimed by", value=f"<@{claimer_id}>", inline=False)
-                                        await select_interaction.response.send_message(embed=embed_already, ephemeral=True)
-                                        return
-                                    # claim it
-                                    set_ticket_claim(ticket_channel.id, select_interaction.user.id)
-                                    # grant selecting user access to the ticket channel (if they don't already have)
-                                    await ticket_channel.set_permissions(select_interaction.user, view_channel=True, send_messages=True)
-                                    # send a private embed message inside the ticket channel to indicate claim
-                                    embed_claim = discord.Embed(title="Ticket Claimed", description=f"This ticket has been claimed by <@{select_interaction.user.id}>", color=discord.Color.gold())
-                                    await ticket_channel.send(embed=embed_claim)
-                                    # send ephemeral confirmation to claimer
-                                    await select_interaction.response.send_message("You have successfully claimed the ticket.", ephemeral=True)
-                                    # log claim in ticket logs channel if configured
-                                    logs_ch = guild.get_channel(cfg["ticket_logs_channel_id"]) if cfg["ticket_logs_channel_id"] else None
-                                    if logs_ch:
-                                        log_embed = discord.Embed(title="Ticket Claimed", description=f"Ticket {ticket_channel.mention} claimed by <@{select_interaction.user.id}>", color=discord.Color.dark_gray())
-                                        await logs_ch.send(embed=log_embed)
-
-                            view = discord.ui.View()
-                            view.add_item(ClaimSelect())
-                            await public_ch.send(embed=public_embed, view=view)
-                        # Respond to the modal submitter ephemeral confirmation
-                        await modal_interaction.response.send_message(f"Your ticket has been created: {ticket_channel.mention}", ephemeral=True)
-
-                modal = IssueModal()
-                await interaction.response.send_modal(modal)
-
-        view = discord.ui.View()
-        view.add_item(TicketSelect())
         try:
-            await ass_ch.send(embed=embed, view=view)
+            await ass_ch.send(embed=embed, view=TicketOpenView())
         except Exception:
             # ignore send failures
             pass
@@ -220,7 +1040,7 @@ async def setup_support(interaction: discord.Interaction,
 @tree.command(name="add_user", description="Ping a user in the assistance channel requesting them to join (private flagged in the assistance channel).")
 @app_commands.describe(user="User to ping")
 async def add_user(interaction: discord.Interaction, user: discord.Member):
-    cfg = load_setup()
+    cfg = await load_setup(interaction.guild.id)
     ass_ch_id = cfg.get("assistance_channel_id")
     if not ass_ch_id:
         await interaction.response.send_message("Support system is not configured. Use /setup_support first.", ephemeral=True)
@@ -243,75 +1063,499 @@ async def add_user(interaction: discord.Interaction, user: discord.Member):
 # claim command: works only in ticket channels. If already claimed, show "it is already claimed" as a beautiful private embed.
 @tree.command(name="claim", description="Claim the ticket in this channel (only works inside a ticket channel).")
 async def claim(interaction: discord.Interaction):
-    cfg = load_setup()
     channel = interaction.channel
-    ticket = get_ticket(channel.id)
+    ticket = await get_ticket(channel.id)
     if not ticket:
         await interaction.response.send_message("This command only works inside a ticket channel.", ephemeral=True)
         return
-    # Check claimant permissions: must be in corresponding role lists
-    ttype = ticket["type"]
-    allowed_role_ids = cfg["gsaccess"] if ttype == "general" else cfg["csaccess"]
-    member_role_ids = [r.id for r in interaction.user.roles]
-    # LOA check
-    loa = cfg.get("loa_role_id")
-    if loa and loa in member_role_ids:
-        await interaction.response.send_message("You are marked LOA and cannot claim tickets.", ephemeral=True)
-        return
-    if not any(rid in member_role_ids for rid in allowed_role_ids):
-        await interaction.response.send_message("You do not have permission to claim this ticket.", ephemeral=True)
-        return
-    # check claimed
-    if ticket.get("claimed_by"):
-        claimer = ticket["claimed_by"]
-        embed_already = discord.Embed(title="Ticket Already Claimed", description="This ticket is already claimed", color=discord.Color.red())
-        embed_already.add_field(name="Claimed by", value=f"<@{claimer}>", inline=False)
-        await interaction.response.send_message(embed=embed_already, ephemeral=True)
-        return
-    # claim
-    set_ticket_claim(channel.id, interaction.user.id)
-    # give claimant channel permissions
-    await channel.set_permissions(interaction.user, view_channel=True, send_messages=True)
-    embed_claim = discord.Embed(title="Ticket Claimed", description=f"This ticket has been claimed by <@{interaction.user.id}>", color=discord.Color.gold())
-    await channel.send(embed=embed_claim)
-    await interaction.response.send_message("You have successfully claimed the ticket.", ephemeral=True)
+    await claim_ticket_channel(interaction, channel, ticket["type"])
 
 # Close ticket command for staff
 @tree.command(name="close_ticket", description="Close the current ticket (staff only).")
 async def close_ticket(interaction: discord.Interaction):
-    cfg = load_setup()
+    cfg = await load_setup(interaction.guild.id)
     channel = interaction.channel
-    ticket = get_ticket(channel.id)
+    ticket = await get_ticket(channel.id)
     if not ticket:
         await interaction.response.send_message("This command only works inside a ticket channel.", ephemeral=True)
         return
     # only allowed staff may close: use gsaccess + csaccess union
-    allowed_role_ids = set(cfg.get("gsaccess", []) + cfg.get("csaccess", []))
-    member_role_ids = {r.id for r in interaction.user.roles}
-    if not allowed_role_ids.intersection(member_role_ids):
+    if not can_close(cfg, member_role_ids(interaction.user)):
         await interaction.response.send_message("You do not have permission to close this ticket.", ephemeral=True)
         return
-    # Log the ticket
-    logs_ch = interaction.guild.get_channel(cfg.get("ticket_logs_channel_id")) if cfg.get("ticket_logs_channel_id") else None
-    if logs_ch:
-        log_embed = discord.Embed(title="Ticket Closed", description=f"Ticket {channel.mention} closed by <@{interaction.user.id}>", color=discord.Color.dark_gray())
-        log_embed.add_field(name="Original Author", value=f"<@{ticket['author_id']}>", inline=False)
-        log_embed.add_field(name="Type", value=ticket['type'], inline=True)
-        log_embed.add_field(name="Claimed by", value=(f"<@{ticket['claimed_by']}>" if ticket['claimed_by'] else "Unclaimed"), inline=True)
-        if ticket.get("description"):
-            log_embed.add_field(name="Description", value=ticket['description'], inline=False)
-        await logs_ch.send(embed=log_embed)
-    # Delete ticket record
-    clear_ticket(channel.id)
-    await channel.delete(reason=f"Ticket closed by {interaction.user}")
-
-# On ready: sync commands
+    if channel.id in _closing:
+        await interaction.response.send_message("This ticket is already being closed.", ephemeral=True)
+        return
+    _closing.add(channel.id)
+    await interaction.response.send_message("Closing ticket — saving the transcript first.")
+    # Export runs in the background; the channel is deleted once it's on disk
+    bot.transcripts.submit(finish_close(channel, interaction.user, ticket, cfg))
+
+async def finish_close(channel: discord.TextChannel, closer: discord.abc.User, ticket: dict, cfg: dict):
+    try:
+        try:
+            path, count, search_text = await bot.transcripts.export(channel)
+        except Exception:
+            log.exception("Transcript export failed for ticket %s", channel.id)
+            try:
+                await channel.send("Transcript export failed, so the ticket was left open. Please try closing it again.")
+            except discord.HTTPException:
+                pass
+            return
+        await record_transcript(channel.guild.id, channel.id, path, count, search_text)
+        # Delete before archiving, so a failed delete leaves an open ticket
+        # that /close_ticket can retry rather than an orphaned channel. The
+        # delete event is ignored while the ID is in _closing.
+        try:
+            await channel.delete(reason=f"Ticket closed by {closer}")
+        except discord.NotFound:
+            pass
+        except discord.HTTPException:
+            log.exception("Deleting ticket channel %s failed", channel.id)
+            try:
+                await channel.send("The transcript was saved but this channel couldn't be deleted, so the ticket was left open. Please try closing it again.")
+            except discord.HTTPException:
+                pass
+            return
+        # Move the ticket record to the archive
+        claimed_by = await archive_ticket(channel.id, closer.id, int(time.time()))
+        forget_ticket(channel.guild.id, channel.id, ticket, claimed_by)
+        # Log the ticket
+        if cfg.get("ticket_logs_channel_id"):
+            log_embed = discord.Embed(title="Ticket Closed", description=f"Ticket {channel.mention} closed by <@{closer.id}>", color=discord.Color.dark_gray())
+            log_embed.add_field(name="Original Author", value=f"<@{ticket['author_id']}>", inline=False)
+            log_embed.add_field(name="Type", value=ticket['type'], inline=True)
+            log_embed.add_field(name="Claimed by", value=(f"<@{ticket['claimed_by']}>" if ticket['claimed_by'] else "Unclaimed"), inline=True)
+            if ticket.get("description"):
+                log_embed.add_field(name="Description", value=ticket['description'][:1024], inline=False)
+            log_embed.add_field(name="Transcript", value=f"`{os.path.basename(path)}` ({count} messages)", inline=False)
+            await bot.log_dispatcher.submit(cfg["ticket_logs_channel_id"], log_embed)
+    finally:
+        _closing.discard(channel.id)
+
+def forget_ticket(guild_id: int, channel_id: int, ticket: dict, claimed_by: Optional[int]):
+    # Drop an archived ticket from the in-memory state
+    open_key = (guild_id, ticket["author_id"], ticket["type"])
+    if _open_tickets.get(open_key) == channel_id:
+        del _open_tickets[open_key]
+    if claimed_by:
+        bot.scheduler.adjust(guild_id, claimed_by, -1)
+    _claims.pop(channel_id, None)
+    _last_activity.pop(channel_id, None)
+    _sweep_notified.pop(channel_id, None)
+
+async def archive_deleted_ticket(guild_id: int, channel_id: int):
+    # A ticket channel removed without /close_ticket (by hand, or while offline)
+    ticket = await get_ticket(channel_id)
+    if ticket is None:
+        return
+    claimed_by = await archive_ticket(channel_id, bot.user.id, int(time.time()))
+    forget_ticket(guild_id, channel_id, ticket, claimed_by)
+
+def _format_duration(seconds: int) -> str:
+    if seconds < 3600:
+        return f"{seconds // 60}m"
+    if seconds < 86400:
+        return f"{seconds // 3600}h"
+    return f"{seconds // 86400}d"
+
+# Ticket statistics, served from rolling counters
+@tree.command(name="ticket_stats", description="Show ticket volume, claim times and staff workload (staff only).")
+async def ticket_stats(interaction: discord.Interaction):
+    cfg = await load_setup(interaction.guild.id)
+    if not can_close(cfg, member_role_ids(interaction.user)):
+        await interaction.response.send_message("You do not have permission to view ticket statistics.", ephemeral=True)
+        return
+    stats = await get_ticket_stats(interaction.guild.id)
+    embed = discord.Embed(title="Ticket Statistics", color=discord.Color.blurple())
+    for ttype in TICKET_TYPES:
+        opened = stats.get(f"opened:{ttype}", 0)
+        closed = stats.get(f"closed:{ttype}", 0)
+        embed.add_field(name=f"{ttype.capitalize()} Support",
+                        value=f"Opened: {opened}\nClaimed: {stats.get(f'claimed:{ttype}', 0)}\nClosed: {closed}\nOpen now: {opened - closed}",
+                        inline=True)
+    claims = sum(stats.get(f"claimed:{ttype}", 0) for ttype in TICKET_TYPES)
+    median = median_claim_bound(stats)
+    if median is None:
+        timing = "No claims yet"
+    else:
+        bound = f"over {_format_duration(CLAIM_LATENCY_BUCKETS[-1])}" if median < 0 else f"≤ {_format_duration(median)}"
+        timing = f"Median: {bound}\nMean: {_format_duration(stats.get('claim_seconds', 0) // claims)}"
+    embed.add_field(name="Time to Claim", value=timing, inline=False)
+    staff = sorted(((int(name.split(":", 1)[1]), value) for name, value in stats.items() if name.startswith("staff_claims:")),
+                   key=lambda item: item[1], reverse=True)[:10]
+    if staff:
+        embed.add_field(name="Staff Workload (claims / open)",
+                        value="\n".join(f"<@{uid}>: {n} / {stats.get(f'staff_open:{uid}', 0)}" for uid, n in staff),
+                        inline=False)
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+SEARCH_PAGE_SIZE = 10
+
+def _parse_date(value: Optional[str]) -> Optional[int]:
+    # YYYY-MM-DD (UTC) -> unix timestamp
+    if not value:
+        return None
+    return int(datetime.datetime.strptime(value.strip(), "%Y-%m-%d").replace(tzinfo=datetime.timezone.utc).timestamp())
+
+# Full-text search over ticket descriptions and transcripts
+@tree.command(name="ticket_search", description="Search open and archived tickets (staff only).")
+@app_commands.describe(
+    query="Words to search for in ticket descriptions and transcripts.",
+    author="Only tickets opened by this user.",
+    ticket_type="Only this ticket type.",
+    since="Only tickets opened on or after this date (YYYY-MM-DD).",
+    until="Only tickets opened before this date (YYYY-MM-DD).",
+    page="Results page (10 per page)."
+)
+@app_commands.choices(ticket_type=[
+    app_commands.Choice(name="General Support", value="general"),
+    app_commands.Choice(name="Community Support", value="community")
+])
+async def ticket_search(interaction: discord.Interaction,
+                        query: str,
+                        author: Optional[discord.User] = None,
+                        ticket_type: Optional[app_commands.Choice[str]] = None,
+                        since: Optional[str] = None,
+                        until: Optional[str] = None,
+                        page: app_commands.Range[int, 1] = 1):
+    cfg = await load_setup(interaction.guild.id)
+    if not can_close(cfg, member_role_ids(interaction.user)):
+        await interaction.response.send_message("You do not have permission to search tickets.", ephemeral=True)
+        return
+    if not query.split():
+        await interaction.response.send_message("Please enter something to search for.", ephemeral=True)
+        return
+    try:
+        since_ts, until_ts = _parse_date(since), _parse_date(until)
+    except ValueError:
+        await interaction.response.send_message("Dates must be in YYYY-MM-DD format.", ephemeral=True)
+        return
+    # Fetch one extra row to know whether there's a next page
+    results = await search_tickets(interaction.guild.id, query,
+                                   author_id=author.id if author else None,
+                                   ttype=ticket_type.value if ticket_type else None,
+                                   since=since_ts, until=until_ts,
+                                   limit=SEARCH_PAGE_SIZE + 1, offset=(page - 1) * SEARCH_PAGE_SIZE)
+    has_more = len(results) > SEARCH_PAGE_SIZE
+    results = results[:SEARCH_PAGE_SIZE]
+    embed = discord.Embed(title="Ticket Search", description=f"Results for **{discord.utils.escape_markdown(query)}** — page {page}", color=discord.Color.blurple())
+    if not results:
+        embed.description += "\n\nNo matching tickets."
+    for r in results:
+        # Field names don't render mentions, so the channel link goes in the value
+        status = "Archived" if r["archived"] else "Open"
+        where = "" if r["archived"] else f" · <#{r['channel_id']}>"
+        embed.add_field(name=f"{r['type'].capitalize()} ticket ({status})",
+                        value=f"<@{r['author_id']}> · <t:{r['created_at']}:d>{where}\n{r['snippet'][:900]}",
+                        inline=False)
+    if has_more:
+        embed.set_footer(text=f"More results: use page:{page + 1}")
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+# Admin view of the warm channel pool
+@tree.command(name="ticket_pool", description="Show pre-created ticket channel pool status.")
+@app_commands.default_permissions(manage_guild=True)
+async def ticket_pool(interaction: discord.Interaction):
+    pool = bot.channel_pool
+    ready = pool.ready(interaction.guild.id)
+    hits, misses = pool.hits[interaction.guild.id], pool.misses[interaction.guild.id]
+    total = hits + misses
+    embed = discord.Embed(title="Ticket Channel Pool", color=discord.Color.blurple())
+    embed.add_field(name="Target size", value=f"{pool.size} per type", inline=True)
+    embed.add_field(name="Ready", value=", ".join(f"{t}: {n}" for t, n in ready.items()), inline=True)
+    embed.add_field(name="Hits / Misses", value=f"{hits} / {misses}" + (f" ({hits / total:.0%} hit rate)" if total else ""), inline=False)
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+# ---- Health ----
+@bot.listen("on_app_command_completion")
+async def record_command_completion(interaction: discord.Interaction, command):
+    record_command_time(interaction, "ok")
+
+metrics.gauge("acrp_open_tickets", "Open tickets known to this process, by type.",
+              lambda: {(("type", t),): n for t, n in Counter(key[2] for key, cid in _open_tickets.items() if cid).items()})
+metrics.gauge("acrp_unclaimed_tickets", "Open tickets not yet claimed through this process.",
+              lambda: sum(1 for cid in _open_tickets.values() if cid and cid not in _claims))
+metrics.gauge("acrp_log_outbox_pending", "Ticket log embeds waiting to be delivered.", lambda: bot.log_dispatcher.pending())
+metrics.gauge("acrp_transcript_exports", "Ticket closes with a transcript export in progress.", lambda: len(bot.transcripts._tasks))
+metrics.gauge("acrp_gateway_latency_seconds", "Gateway heartbeat latency.", lambda: bot.latency)
+
+def _bound_ms(seconds: float) -> str:
+    # Histogram quantiles are bucket upper bounds
+    if seconds == float("inf"):
+        return f">{metrics.LATENCY_BUCKETS[-1]:g}s"
+    return f"≤{seconds * 1000:g}ms"
+
+def _histogram_lines(name: str, sort_key, describe, limit: int = 8) -> str:
+    rows = sorted(metrics.histograms(name).items(), key=lambda kv: sort_key(kv[1]), reverse=True)[:limit]
+    lines = [f"`{' '.join(str(v) for _, v in labels)}` {describe(h)}" for labels, h in rows]
+    return "\n".join(lines) or "No samples yet"
+
+@tree.command(name="bot_health", description="Show latency, storage and Discord API health for this bot process.")
+@app_commands.default_permissions(administrator=True)
+async def bot_health(interaction: discord.Interaction):
+    def quantiles(h):
+        return f"{h.count}× p50 {_bound_ms(h.quantile(0.5))} p99 {_bound_ms(h.quantile(0.99))}"
+
+    lag = metrics.histograms("acrp_event_loop_lag_seconds").get(())
+    api = metrics.counters("acrp_discord_api_requests_total")
+    limited = Counter()
+    for labels, n in api.items():
+        if dict(labels)["status"] == "429":
+            limited[dict(labels)["route"]] += n
+    guild_id = interaction.guild.id
+    open_ids = [cid for key, cid in _open_tickets.items() if key[0] == guild_id and cid]
+
+    embed = discord.Embed(title="Bot Health", color=discord.Color.blurple())
+    heartbeat = f"{bot.latency * 1000:.0f}ms" if bot.shards else "not connected"
+    embed.add_field(name="Gateway", value=f"Heartbeat {heartbeat}\n{bot.shard_count or 1} shard(s), {len(bot.guilds)} guilds\n"
+                                          f"Up {_format_duration(int(time.time() - metrics.STARTED))}", inline=True)
+    embed.add_field(name="Event loop lag", value=f"Last {metrics.last_loop_lag * 1000:.1f}ms\n" + (f"p99 {_bound_ms(lag.quantile(0.99))}" if lag else ""), inline=True)
+    embed.add_field(name="This server", value=f"{len(open_ids)} open, {sum(1 for cid in open_ids if cid not in _claims)} unclaimed\n"
+                                              f"{bot.log_dispatcher.pending()} log embeds queued", inline=True)
+    embed.add_field(name="Commands", value=_histogram_lines("acrp_command_seconds", lambda h: h.count, quantiles), inline=False)
+    embed.add_field(name="Components", value=_histogram_lines("acrp_component_seconds", lambda h: h.count, quantiles), inline=False)
+    embed.add_field(name="Storage (by total time)", value=_histogram_lines(
+        "acrp_db_seconds", lambda h: h.sum, lambda h: f"{h.count}× avg {h.sum / h.count * 1000:.1f}ms p99 {_bound_ms(h.quantile(0.99))}"), inline=False)
+    api_lines = [f"{sum(api.values()):.0f} requests, {sum(limited.values()):.0f} rate limited"]
+    api_lines += [f"`{route}` {n:.0f}× 429" for route, n in limited.most_common(5)]
+    embed.add_field(name="Discord API", value="\n".join(api_lines), inline=False)
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+# Keep the pool topped up in the background
+@tasks.loop(seconds=POOL_REFILL_SECONDS)
+async def refill_channel_pool():
+    for guild in bot.guilds:
+        cfg = await load_setup(guild.id)
+        if not cfg["category_id"]:
+            continue
+        try:
+            await bot.channel_pool.refill(guild, cfg, bot.categories)
+        except discord.HTTPException as e:
+            log.warning("Channel pool refill failed for guild %s: %s", guild.id, e)
+
+@refill_channel_pool.before_loop
+async def before_refill_channel_pool():
+    await bot.wait_until_ready()
+
+# Remove overflow ticket categories once they empty out
+@tasks.loop(minutes=CATEGORY_PRUNE_MINUTES)
+async def prune_ticket_categories():
+    for guild in bot.guilds:
+        cfg = await load_setup(guild.id)
+        if not cfg["category_id"]:
+            continue
+        try:
+            await bot.categories.prune(guild, cfg["category_id"])
+        except discord.HTTPException as e:
+            log.warning("Category prune failed for guild %s: %s", guild.id, e)
+
+@prune_ticket_categories.before_loop
+async def before_prune_ticket_categories():
+    await bot.wait_until_ready()
+
+# ---- Stale ticket sweeper ----
+# Thresholds in hours; 0 disables that step.
+SWEEP_MINUTES = int(CONFIG.get("sweep_interval_minutes", 10))
+STALE_REMIND_HOURS = float(CONFIG.get("stale_unclaimed_remind_hours", 2))
+STALE_ESCALATE_HOURS = float(CONFIG.get("stale_unclaimed_escalate_hours", 12))
+STALE_CLOSE_HOURS = float(CONFIG.get("stale_inactive_close_hours", 72))
+SWEEP_BATCH_SIZE = 5  # actions per sweep, to stay well inside rate limits
+SWEEP_ACTION_DELAY = 1.0
+REMIND_MAX_MENTIONS = 50  # keeps the reminder under the 2000 character message limit
+
+# Channel -> unix time of the last non-bot message, fed by on_message so the
+# sweeper never fetches history. Before the first message after a restart,
+# activity falls back to the later of open/claim time and process start.
+_last_activity = {}
+# Channel -> highest reminder level sent (1 reminded, 2 escalated)
+_sweep_notified = {}
+_started_at = int(time.time())
+
+@bot.listen("on_message")
+async def track_ticket_activity(message: discord.Message):
+    if message.guild is not None and not message.author.bot:
+        _last_activity[message.channel.id] = int(message.created_at.timestamp())
+
+async def _remind_unclaimed(channel: discord.TextChannel, ticket: dict, cfg: dict, hours: int):
+    # Ping staff individually rather than the access roles, which would reach LOA members
+    staff = sorted(await bot.scheduler.eligible(channel.guild, cfg, ticket["type"]))
+    mentions = " ".join(f"<@{mid}>" for mid in staff[:REMIND_MAX_MENTIONS])
+    embed = discord.Embed(title="Ticket Waiting", description=f"This ticket has been waiting {hours}h without being claimed.", color=discord.Color.orange())
+    await channel.send(content=mentions or None, embed=embed,
+                       allowed_mentions=discord.AllowedMentions(users=True, roles=False))
+
+async def _escalate_unclaimed(channel: discord.TextChannel, ticket: dict, cfg: dict, hours: int):
+    if cfg["ticket_logs_channel_id"]:
+        embed = discord.Embed(title="Unclaimed Ticket Escalated", description=f"Ticket {channel.mention} has been unclaimed for {hours}h.", color=discord.Color.red())
+        embed.add_field(name="Original Author", value=f"<@{ticket['author_id']}>", inline=True)
+        embed.add_field(name="Type", value=ticket["type"], inline=True)
+        await bot.log_dispatcher.submit(cfg["ticket_logs_channel_id"], embed)
+
+async def _close_inactive(channel: discord.TextChannel, ticket: dict, cfg: dict, hours: int):
+    if channel.id in _closing:
+        return
+    _closing.add(channel.id)
+    try:
+        await channel.send(f"Closing this ticket after {hours}h without activity.")
+    except Exception:
+        # finish_close releases _closing, but it never started
+        _closing.discard(channel.id)
+        raise
+    await finish_close(channel, bot.user, ticket, cfg)
+
+@tasks.loop(minutes=SWEEP_MINUTES)
+async def sweep_stale_tickets():
+    # A tasks.loop stops for good on an uncaught exception, so failures are
+    # logged and the sweep carries on (or retries on the next run)
+    try:
+        actions = await _find_stale_actions()
+    except Exception:
+        log.exception("Stale sweep scan failed")
+        return
+    done = 0
+    for level, ticket, action, age in actions:
+        if done >= SWEEP_BATCH_SIZE:
+            break
+        guild = bot.get_guild(ticket["guild_id"])
+        if guild is None or guild.unavailable:
+            continue
+        try:
+            channel = guild.get_channel(ticket["channel_id"])
+            if channel is None:
+                # Deleted while the bot was offline
+                await archive_deleted_ticket(guild.id, ticket["channel_id"])
+                continue
+            cfg = await load_setup(guild.id)
+            await action(channel, ticket, cfg, age // 3600)
+            if level < 3:
+                _sweep_notified[channel.id] = level
+        except Exception:
+            log.exception("Stale sweep action failed for ticket %s", ticket["channel_id"])
+        done += 1
+        await asyncio.sleep(SWEEP_ACTION_DELAY)
+    if len(actions) > done:
+        log.info("Stale sweep: %d actions deferred to the next run", len(actions) - done)
+
+async def _find_stale_actions() -> list:
+    now = int(time.time())
+    actions = []
+    if STALE_REMIND_HOURS:
+        for ticket in await find_unclaimed_tickets(now - int(STALE_REMIND_HOURS * 3600)):
+            age = now - ticket["created_at"]
+            level = 2 if STALE_ESCALATE_HOURS and age >= STALE_ESCALATE_HOURS * 3600 else 1
+            if _sweep_notified.get(ticket["channel_id"], 0) < level:
+                actions.append((level, ticket, _escalate_unclaimed if level == 2 else _remind_unclaimed, age))
+    if STALE_CLOSE_HOURS:
+        cutoff = int(STALE_CLOSE_HOURS * 3600)
+        for ticket in await find_tickets_created_before([g.id for g in bot.guilds], now - cutoff):
+            last = max(_last_activity.get(ticket["channel_id"], 0), ticket["created_at"], ticket["claimed_at"] or 0, _started_at)
+            if now - last >= cutoff:
+                actions.append((3, ticket, _close_inactive, now - last))
+    return actions
+
+@sweep_stale_tickets.before_loop
+async def before_sweep_stale_tickets():
+    await bot.wait_until_ready()
+
+# Keep per-category channel counts current
 @bot.event
-async def on_ready():
+async def on_guild_channel_create(channel: discord.abc.GuildChannel):
+    bot.categories.created(channel)
+
+@bot.event
+async def on_guild_channel_delete(channel: discord.abc.GuildChannel):
+    bot.categories.deleted(channel)
+    # Deletes done by finish_close are already archived
+    if isinstance(channel, discord.TextChannel) and channel.id not in _closing:
+        await archive_deleted_ticket(channel.guild.id, channel.id)
+
+@bot.event
+async def on_guild_channel_update(before: discord.abc.GuildChannel, after: discord.abc.GuildChannel):
+    if before.category_id != after.category_id:
+        bot.categories.track(before.category_id, -1)
+        bot.categories.track(after.category_id, 1)
+
+# Keep the member role index and config cache in step with role changes
+@bot.event
+async def on_member_update(before: discord.Member, after: discord.Member):
+    if before.roles != after.roles:
+        bot.scheduler.refresh_member(after, await load_setup(after.guild.id))
+
+@bot.event
+async def on_guild_role_delete(role: discord.Role):
+    discard_role(role.guild.id, role.id)
+    bot.scheduler.reset(role.guild.id)
+
+# ---- Startup ----
+def command_fingerprint() -> str:
+    # Hash of the command payloads tree.sync() would upload
+    payload = [cmd.to_dict(tree) for cmd_type in discord.AppCommandType for cmd in tree.get_commands(type=cmd_type)]
+    payload.sort(key=lambda d: (d.get("type", 1), d["name"]))
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+async def sync_commands():
+    # Global sync is rate limited, so it only happens when the command tree
+    # changed since the last sync recorded for this application. Set
+    # ACRP_FORCE_SYNC=1 if commands were changed elsewhere.
+    key = f"command_fingerprint:{bot.application_id}"
+    fingerprint = command_fingerprint()
+    if not os.environ.get("ACRP_FORCE_SYNC") and await get_state(key) == fingerprint:
+        print("Commands unchanged, skipping sync.")
+        return
     await tree.sync()
-    print(f"Logged in as {bot.user} (ID: {bot.user.id})")
+    await set_state(key, fingerprint)
     print("Commands synced.")
 
+metrics.gauge("acrp_startup_seconds", "Time spent in each startup stage.",
+              lambda: {(("stage", k),): v / 1000 for k, v in bot.startup_stages.items()})
+
+async def adopt_legacy_config():
+    # A config migrated from the single-guild schema belongs to the guild
+    # that owns its channels. With shards split across processes, the one
+    # that sees those channels adopts it.
+    for channel_id in await legacy_setup_channels():
+        channel = bot.get_channel(channel_id)
+        if channel is not None:
+            await adopt_legacy_setup(channel.guild.id)
+            # load_open_tickets ran before adoption and keyed those tickets
+            # under a None guild; move them so dedupe and forget_ticket see them
+            for key in [k for k in _open_tickets if k[0] is None]:
+                _open_tickets.setdefault((channel.guild.id,) + key[1:], _open_tickets.pop(key))
+            print(f"Adopted the pre-multi-guild config for guild {channel.guild.id}")
+            return
+
+# Fires again after a full reconnect; nothing is re-synced or reloaded here
+@bot.event
+async def on_ready():
+    print(f"Logged in as {bot.user} (ID: {bot.user.id})")
+    await adopt_legacy_config()
+    if not bot._ready_once:
+        bot._ready_once = True
+        bot.startup_stages["ready"] = (time.perf_counter() - STARTED) * 1000
+        print("Startup: " + ", ".join(f"{name} {ms:.0f}ms" for name, ms in bot.startup_stages.items()))
+
+@bot.event
+async def on_shard_disconnect(shard_id: int):
+    bot._shard_disconnects.setdefault(shard_id, time.perf_counter())
+
+async def _shard_back(shard_id: int, how: str):
+    started = bot._shard_disconnects.pop(shard_id, None)
+    if started is not None:
+        elapsed = time.perf_counter() - started
+        metrics.observe("acrp_shard_reconnect_seconds", elapsed, how=how)
+        print(f"Shard {shard_id} {how} {elapsed * 1000:.0f}ms after disconnecting")
+
+@bot.event
+async def on_shard_ready(shard_id: int):
+    await _shard_back(shard_id, "ready")
+
+@bot.event
+async def on_shard_resumed(shard_id: int):
+    await _shard_back(shard_id, "resumed")
+
 # Run the bot
 if __name__ == "__main__":
+    if not TOKEN or TOKEN == "YOUR_BOT_TOKEN_HERE":
+        raise RuntimeError("Please set your bot token in config.json before running.")
     bot.run(TOKEN)
@@ -0,0 +1,202 @@
+# metrics.py
+# In-process counters, histograms and gauges for bot.py and utils.py,
+# rendered in the Prometheus text format. Everything is updated from the
+# event loop thread, so no locking is needed and recording a sample is a
+# dict lookup plus a bisect.
+import re
+import time
+import bisect
+import asyncio
+import functools
+from typing import Callable, Dict, Tuple
+
+import aiohttp
+from aiohttp import web
+
+# Upper bounds (seconds) shared by every latency histogram
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name -> (type, help) for the metrics recorded directly; gauges add theirs
+HELP = {
+    "acrp_command_seconds": ("histogram", "Slash command handling time, by command and outcome."),
+    "acrp_component_seconds": ("histogram", "Dropdown and modal callback time, by component."),
+    "acrp_db_seconds": ("histogram", "Storage operation time including queueing, by utils function."),
+    "acrp_discord_api_seconds": ("histogram", "Discord REST request time, by route."),
+    "acrp_discord_api_requests_total": ("counter", "Discord REST responses by route and status (429 = rate limited)."),
+    "acrp_event_loop_lag_seconds": ("histogram", "How late the event loop woke a sleeping task."),
+    "acrp_shard_reconnect_seconds": ("histogram", "Time from a shard disconnecting to it being ready again."),
+}
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        # Upper bound of the bucket holding the q-th sample (inf past the last one)
+        rank, seen = q * self.count, 0
+        for bound, n in zip(LATENCY_BUCKETS + (float("inf"),), self.counts):
+            seen += n
+            if seen and seen >= rank:
+                return bound
+        return 0.0
+
+
+# (name, labels) -> Histogram / value, labels being a tuple of (key, value)
+_histograms: Dict[Tuple[str, tuple], Histogram] = {}
+_counters: Dict[Tuple[str, tuple], float] = {}
+# name -> callable returning a number or a {labels: number} dict
+_gauges: Dict[str, Callable] = {}
+
+STARTED = time.time()
+last_loop_lag = 0.0
+
+
+def observe(name: str, value: float, **labels):
+    key = (name, tuple(labels.items()))
+    hist = _histograms.get(key)
+    if hist is None:
+        hist = _histograms[key] = Histogram()
+    hist.observe(value)
+
+
+def inc(name: str, value: float = 1, **labels):
+    key = (name, tuple(labels.items()))
+    _counters[key] = _counters.get(key, 0) + value
+
+
+def gauge(name: str, help_text: str, fn: Callable):
+    HELP[name] = ("gauge", help_text)
+    _gauges[name] = fn
+
+
+def histograms(name: str) -> Dict[tuple, Histogram]:
+    return {labels: h for (n, labels), h in _histograms.items() if n == name}
+
+
+def counters(name: str) -> Dict[tuple, float]:
+    return {labels: v for (n, labels), v in _counters.items() if n == name}
+
+
+def timed(name: str, **labels):
+    # Decorator recording how long an async callback takes
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                observe(name, time.perf_counter() - started, **labels)
+        return wrapper
+    return decorator
+
+
+# ---- Prometheus text format ----
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _labels(labels, extra=()) -> str:
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+def _bound(value: float) -> str:
+    return "+Inf" if value == float("inf") else repr(value)
+
+def render() -> str:
+    lines = []
+    series = {}
+    for (name, labels), hist in _histograms.items():
+        series.setdefault(name, []).append((labels, hist))
+    for (name, labels), value in _counters.items():
+        series.setdefault(name, []).append((labels, value))
+    for name, fn in _gauges.items():
+        try:
+            value = fn()
+        except Exception:
+            continue
+        items = value.items() if isinstance(value, dict) else [((), value)]
+        series.setdefault(name, []).extend(items)
+    for name in sorted(series):
+        kind, help_text = HELP.get(name, ("untyped", ""))
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in series[name]:
+            if isinstance(value, Histogram):
+                cumulative = 0
+                for bound, n in zip(LATENCY_BUCKETS + (float("inf"),), value.counts):
+                    cumulative += n
+                    lines.append(f"{name}_bucket{_labels(labels, [('le', _bound(bound))])} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {value.sum!r}")
+                lines.append(f"{name}_count{_labels(labels)} {value.count}")
+            else:
+                lines.append(f"{name}{_labels(labels)} {float(value)!r}")
+    return "\n".join(lines) + "\n"
+
+
+# ---- Collectors ----
+
+async def watch_loop_lag(interval: float = 0.5):
+    # Oversleep beyond the requested interval is time the loop spent blocked
+    global last_loop_lag
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        last_loop_lag = max(0.0, time.perf_counter() - started - interval)
+        observe("acrp_event_loop_lag_seconds", last_loop_lag)
+
+
+_API_PREFIX = re.compile(r"^/api/v\d+")
+_SNOWFLAKE = re.compile(r"/\d{15,21}(?=/|$)")
+_TOKEN = re.compile(r"^(/(?:interactions|webhooks)/\{id\})/[^/]+")
+
+def api_route(method: str, path: str) -> str:
+    # /api/v10/channels/123/messages -> "POST /channels/{id}/messages"
+    path = _SNOWFLAKE.sub("/{id}", _API_PREFIX.sub("", path))
+    path = _TOKEN.sub(r"\1/{token}", path)
+    return f"{method} {path}"
+
+def http_trace() -> aiohttp.TraceConfig:
+    # Passed to the client as http_trace; sees every REST attempt, including
+    # the 429s discord.py retries internally
+    trace = aiohttp.TraceConfig()
+
+    async def on_request_start(session, ctx, params):
+        ctx.started = time.perf_counter()
+
+    async def on_request_end(session, ctx, params):
+        if not params.url.path.startswith("/api/"):
+            return
+        route = api_route(params.method, params.url.path)
+        observe("acrp_discord_api_seconds", time.perf_counter() - ctx.started, route=route)
+        inc("acrp_discord_api_requests_total", route=route, status=str(params.response.status))
+
+    trace.on_request_start.append(on_request_start)
+    trace.on_request_end.append(on_request_end)
+    return trace
+
+
+async def serve(host: str, port: int) -> web.AppRunner:
+    # GET /metrics on a local port for Prometheus to scrape
+    async def handle(request):
+        return web.Response(body=render().encode("utf-8"),
+                            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -3,17 +3,198 @@
 import sqlite3
 import json
 import os
-from typing import Optional, List, Dict, Any
+import time
+import queue
+import atexit
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional, List, Dict, Any, Callable, AbstractSet, Tuple
+
+import metrics
 
 DB_PATH = "acrp_tickets.db"
 
+# guild_id given to a config row migrated from the old single-row schema
+LEGACY_GUILD_ID = 0
+
+# Storage engine tuning. Writes go through one writer thread with a bounded
+# queue; writes that arrive within GROUP_COMMIT_WINDOW of each other share a
+# single transaction (one fsync). Reads run on a small pool of long-lived
+# connections, which WAL mode lets proceed alongside the writer.
+WRITE_QUEUE_SIZE = 1024
+GROUP_COMMIT_WINDOW = 0.005
+GROUP_COMMIT_MAX = 64
+READ_POOL_SIZE = 4
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    # isolation_level=None: transactions are managed explicitly by the writer
+    conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    return conn
+
+
+def _op_name(fn) -> str:
+    # "load_setup.<locals>.op" -> "load_setup": the utils function issuing the op
+    return fn.__qualname__.split(".", 1)[0]
+
+
+class Storage:
+    """Long-lived SQLite connections driven off the event loop.
+
+    ``write`` and ``read`` take a callable that receives a connection and
+    return an awaitable for its result.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._writes: "queue.Queue" = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+        self._local = threading.local()
+        self._readers: Optional[ThreadPoolExecutor] = None
+        self._writer: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._writer is not None:
+                return
+            self._readers = ThreadPoolExecutor(max_workers=READ_POOL_SIZE, thread_name_prefix="acrp-db-read")
+            self._writer = threading.Thread(target=self._writer_loop, name="acrp-db-write", daemon=True)
+            self._writer.start()
+
+    def close(self):
+        with self._lock:
+            if self._writer is None:
+                return
+            self._writes.put(None)
+            self._writer.join()
+            self._writer = None
+            self._readers.shutdown(wait=True)
+            self._readers = None
+
+    # ---- reads ----
+    def _reader_conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = _connect(self.path)
+            self._local.conn = conn
+        return conn
+
+    def _run_read(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        return fn(self._reader_conn())
+
+    async def read(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            return await loop.run_in_executor(self._readers, self._run_read, fn)
+        finally:
+            metrics.observe("acrp_db_seconds", time.perf_counter() - started, function=_op_name(fn), kind="read")
+
+    # ---- writes ----
+    async def write(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        fut: Future = Future()
+        item = (fn, fut)
+        started = time.perf_counter()
+        try:
+            self._writes.put_nowait(item)
+        except queue.Full:
+            # Backpressure: wait for room without blocking the event loop
+            await asyncio.get_running_loop().run_in_executor(None, self._writes.put, item)
+        try:
+            return await asyncio.wrap_future(fut)
+        finally:
+            metrics.observe("acrp_db_seconds", time.perf_counter() - started, function=_op_name(fn), kind="write")
+
+    def _writer_loop(self):
+        conn = _connect(self.path)
+        stopping = False
+        while not stopping:
+            item = self._writes.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.monotonic() + GROUP_COMMIT_WINDOW
+            while len(batch) < GROUP_COMMIT_MAX:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    nxt = self._writes.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    stopping = True
+                    break
+                batch.append(nxt)
+            self._commit_batch(conn, batch)
+        conn.close()
+
+    def _commit_batch(self, conn: sqlite3.Connection, batch):
+        # Each op runs in its own savepoint so one failure doesn't undo the
+        # rest of the group; the whole group is made durable by one COMMIT.
+        results = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for fn, fut in batch:
+                conn.execute("SAVEPOINT op")
+                try:
+                    results.append((fut, fn(conn), None))
+                    conn.execute("RELEASE op")
+                except Exception as e:
+                    conn.execute("ROLLBACK TO op")
+                    conn.execute("RELEASE op")
+                    results.append((fut, None, e))
+            conn.execute("COMMIT")
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for _, fut in batch:
+                fut.set_exception(e)
+            return
+        for fut, result, exc in results:
+            if exc is not None:
+                fut.set_exception(exc)
+            else:
+                fut.set_result(result)
+
+
+_storage: Optional[Storage] = None
+
+
+def get_storage() -> Storage:
+    if _storage is None:
+        raise RuntimeError("Database not initialised; call init_db() first.")
+    return _storage
+
+
+def close_db():
+    global _storage
+    if _storage is not None:
+        _storage.close()
+        _storage = None
+
+
+atexit.register(close_db)
+
+
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
+    global _storage
+    conn = _connect(DB_PATH)
     c = conn.cursor()
-    # Setup table for configuration
+    c.execute("BEGIN")
+    # Setup table for configuration, one row per guild
+    cols = [r[1] for r in c.execute("PRAGMA table_info(setup)")]
+    legacy = bool(cols) and "guild_id" not in cols
+    if legacy:
+        # Pre-multi-guild schema pinned config to a single row (id = 1)
+        c.execute("ALTER TABLE setup RENAME TO setup_v1")
     c.execute("""
     CREATE TABLE IF NOT EXISTS setup (
-        id INTEGER PRIMARY KEY CHECK (id = 1),
+        guild_id INTEGER PRIMARY KEY,
         assistance_channel_id INTEGER,
         general_requests_channel_id INTEGER,
         community_requests_channel_id INTEGER,
@@ -24,14 +205,22 @@ def init_db():
         category_id INTEGER
     )
     """)
-    # Single-row config. Insert default empty row if not present
-    c.execute("SELECT COUNT(*) FROM setup")
-    if c.fetchone()[0] == 0:
-        c.execute("INSERT INTO setup (id) VALUES (1)")
+    if legacy:
+        # The old row isn't tied to a guild yet; LEGACY_GUILD_ID marks it
+        # until adopt_legacy_setup() hands it to the guild owning its channels.
+        c.execute("""
+        INSERT INTO setup (guild_id, assistance_channel_id, general_requests_channel_id, community_requests_channel_id,
+                           gsaccess, csaccess, loa_role_id, ticket_logs_channel_id, category_id)
+        SELECT ?, assistance_channel_id, general_requests_channel_id, community_requests_channel_id,
+               gsaccess, csaccess, loa_role_id, ticket_logs_channel_id, category_id
+        FROM setup_v1 WHERE id = 1
+        """, (LEGACY_GUILD_ID,))
+        c.execute("DROP TABLE setup_v1")
     # Table for tickets
     c.execute("""
     CREATE TABLE IF NOT EXISTS tickets (
         channel_id INTEGER PRIMARY KEY,
+        guild_id INTEGER,
         author_id INTEGER,
         type TEXT,
         description TEXT,
@@ -39,10 +228,188 @@ def init_db():
         created_at INTEGER
     )
     """)
-    conn.commit()
+    cols = [r[1] for r in c.execute("PRAGMA table_info(tickets)")]
+    if "guild_id" not in cols:
+        c.execute("ALTER TABLE tickets ADD COLUMN guild_id INTEGER")
+    if "claimed_at" not in cols:
+        c.execute("ALTER TABLE tickets ADD COLUMN claimed_at INTEGER")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_tickets_guild ON tickets (guild_id, created_at)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_tickets_claim_age ON tickets (claimed_by, created_at)")
+    # Closed tickets are moved here instead of being deleted
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS ticket_archive (
+        channel_id INTEGER PRIMARY KEY,
+        guild_id INTEGER,
+        author_id INTEGER,
+        type TEXT,
+        description TEXT,
+        claimed_by INTEGER,
+        created_at INTEGER,
+        claimed_at INTEGER,
+        closed_at INTEGER,
+        closed_by INTEGER
+    )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_archive_guild_closed ON ticket_archive (guild_id, closed_at)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_archive_author ON ticket_archive (guild_id, author_id, closed_at)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_archive_claimer ON ticket_archive (guild_id, claimed_by, closed_at)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_archive_created ON ticket_archive (guild_id, created_at)")
+    # Rolling per-guild counters, updated in the same transaction as each
+    # create/claim/close so stats never need to scan tickets
+    counters_exist = c.execute("SELECT 1 FROM sqlite_master WHERE name = 'ticket_counters'").fetchone()
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS ticket_counters (
+        guild_id INTEGER,
+        name TEXT,
+        value INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (guild_id, name)
+    )
+    """)
+    if not counters_exist:
+        # Tickets opened before the counters existed still get closed (and
+        # their claims released) through them, so count them in once
+        c.execute("""
+        INSERT INTO ticket_counters (guild_id, name, value)
+        SELECT guild_id, 'opened:' || type, COUNT(*) FROM tickets GROUP BY guild_id, type
+        UNION ALL
+        SELECT guild_id, 'claimed:' || type, COUNT(*) FROM tickets WHERE claimed_by IS NOT NULL GROUP BY guild_id, type
+        UNION ALL
+        SELECT guild_id, 'staff_claims:' || claimed_by, COUNT(*) FROM tickets WHERE claimed_by IS NOT NULL GROUP BY guild_id, claimed_by
+        UNION ALL
+        SELECT guild_id, 'staff_open:' || claimed_by, COUNT(*) FROM tickets WHERE claimed_by IS NOT NULL GROUP BY guild_id, claimed_by
+        """)
+    # Overflow categories created when a guild's ticket category fills up
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS ticket_categories (
+        category_id INTEGER PRIMARY KEY,
+        guild_id INTEGER,
+        base_category_id INTEGER
+    )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_ticket_categories_base ON ticket_categories (guild_id, base_category_id)")
+    # Exported transcripts of closed tickets
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS transcripts (
+        channel_id INTEGER PRIMARY KEY,
+        guild_id INTEGER,
+        path TEXT,
+        message_count INTEGER,
+        created_at INTEGER
+    )
+    """)
+    cols = [r[1] for r in c.execute("PRAGMA table_info(transcripts)")]
+    if "search_text" not in cols:
+        c.execute("ALTER TABLE transcripts ADD COLUMN search_text TEXT")
+    # Full-text index over ticket descriptions and transcripts, one row per
+    # ticket (rowid = channel_id), kept in sync by the triggers below
+    fts_exists = c.execute("SELECT 1 FROM sqlite_master WHERE name = 'ticket_fts'").fetchone()
+    fts_tracks_guild = c.execute("SELECT 1 FROM sqlite_master WHERE name = 'tickets_fts_guild'").fetchone()
+    c.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS ticket_fts USING fts5(
+        description,
+        transcript,
+        guild_id UNINDEXED,
+        author_id UNINDEXED,
+        type UNINDEXED,
+        created_at UNINDEXED,
+        archived UNINDEXED
+    )
+    """)
+    c.execute("""
+    CREATE TRIGGER IF NOT EXISTS tickets_fts_insert AFTER INSERT ON tickets BEGIN
+        INSERT OR REPLACE INTO ticket_fts (rowid, description, transcript, guild_id, author_id, type, created_at, archived)
+        VALUES (new.channel_id, new.description, NULL, new.guild_id, new.author_id, new.type, new.created_at, 0);
+    END
+    """)
+    c.execute("""
+    CREATE TRIGGER IF NOT EXISTS tickets_fts_delete AFTER DELETE ON tickets
+    WHEN NOT EXISTS (SELECT 1 FROM ticket_archive WHERE channel_id = old.channel_id) BEGIN
+        DELETE FROM ticket_fts WHERE rowid = old.channel_id;
+    END
+    """)
+    c.execute("""
+    CREATE TRIGGER IF NOT EXISTS transcripts_fts_insert AFTER INSERT ON transcripts BEGIN
+        UPDATE ticket_fts SET transcript = new.search_text WHERE rowid = new.channel_id;
+    END
+    """)
+    c.execute("""
+    CREATE TRIGGER IF NOT EXISTS archive_fts_insert AFTER INSERT ON ticket_archive BEGIN
+        INSERT OR REPLACE INTO ticket_fts (rowid, description, transcript, guild_id, author_id, type, created_at, archived)
+        VALUES (new.channel_id, new.description,
+                (SELECT search_text FROM transcripts WHERE channel_id = new.channel_id),
+                new.guild_id, new.author_id, new.type, new.created_at, 1);
+    END
+    """)
+    c.execute("""
+    CREATE TRIGGER IF NOT EXISTS archive_fts_delete AFTER DELETE ON ticket_archive BEGIN
+        DELETE FROM ticket_fts WHERE rowid = old.channel_id;
+    END
+    """)
+    # guild_id changes when a migrated config is adopted
+    c.execute("""
+    CREATE TRIGGER IF NOT EXISTS tickets_fts_guild AFTER UPDATE OF guild_id ON tickets BEGIN
+        UPDATE ticket_fts SET guild_id = new.guild_id WHERE rowid = new.channel_id;
+    END
+    """)
+    c.execute("""
+    CREATE TRIGGER IF NOT EXISTS archive_fts_guild AFTER UPDATE OF guild_id ON ticket_archive BEGIN
+        UPDATE ticket_fts SET guild_id = new.guild_id WHERE rowid = new.channel_id;
+    END
+    """)
+    if fts_exists and not fts_tracks_guild:
+        # Rows adopted before the triggers above existed
+        c.execute("""
+        UPDATE ticket_fts SET guild_id = COALESCE(
+            (SELECT guild_id FROM tickets WHERE channel_id = ticket_fts.rowid),
+            (SELECT guild_id FROM ticket_archive WHERE channel_id = ticket_fts.rowid))
+        WHERE guild_id IS NULL
+        """)
+    if not fts_exists:
+        # First run with search: index what's already there
+        c.execute("""
+        INSERT INTO ticket_fts (rowid, description, transcript, guild_id, author_id, type, created_at, archived)
+        SELECT a.channel_id, a.description, t.search_text, a.guild_id, a.author_id, a.type, a.created_at, 1
+        FROM ticket_archive a LEFT JOIN transcripts t ON t.channel_id = a.channel_id
+        """)
+        c.execute("""
+        INSERT INTO ticket_fts (rowid, description, transcript, guild_id, author_id, type, created_at, archived)
+        SELECT channel_id, description, NULL, guild_id, author_id, type, created_at, 0 FROM tickets
+        """)
+    # Ticket log events not yet delivered to the logs channel
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS log_outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        channel_id INTEGER,
+        embed TEXT,
+        created_at INTEGER
+    )
+    """)
+    # Small key/value store for process bookkeeping (e.g. the synced command fingerprint)
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS bot_state (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    )
+    """)
+    c.execute("COMMIT")
     conn.close()
+    if _storage is None:
+        _storage = Storage(DB_PATH)
+        _storage.start()
+
+_SETUP_COLUMNS = (
+    "assistance_channel_id",
+    "general_requests_channel_id",
+    "community_requests_channel_id",
+    "gsaccess",
+    "csaccess",
+    "loa_role_id",
+    "ticket_logs_channel_id",
+    "category_id"
+)
 
-def save_setup(
+async def save_setup(
+    guild_id: int,
     assistance_channel_id: Optional[int],
     general_requests_channel_id: Optional[int],
     community_requests_channel_id: Optional[int],
@@ -52,20 +419,8 @@ def save_setup(
     ticket_logs_channel_id: Optional[int],
     category_id: Optional[int]
 ):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("""
-      UPDATE setup SET
-        assistance_channel_id = ?,
-        general_requests_channel_id = ?,
-        community_requests_channel_id = ?,
-        gsaccess = ?,
-        csaccess = ?,
-        loa_role_id = ?,
-        ticket_logs_channel_id = ?,
-        category_id = ?
-      WHERE id = 1
-    """, (
+    params = (
+        guild_id,
         assistance_channel_id,
         general_requests_channel_id,
         community_requests_channel_id,
@@ -74,25 +429,95 @@ def save_setup(
         loa_role_id,
         ticket_logs_channel_id,
         category_id
-    ))
-    conn.commit()
-    conn.close()
+    )
+    def op(conn):
+        conn.execute("""
+          INSERT OR REPLACE INTO setup (guild_id, assistance_channel_id, general_requests_channel_id, community_requests_channel_id,
+                                        gsaccess, csaccess, loa_role_id, ticket_logs_channel_id, category_id)
+          VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, params)
+    await get_storage().write(op)
+    # Write-through: the cache reflects exactly what was committed
+    _setup_cache[guild_id] = _index_setup({
+        "assistance_channel_id": assistance_channel_id,
+        "general_requests_channel_id": general_requests_channel_id,
+        "community_requests_channel_id": community_requests_channel_id,
+        "gsaccess": list(gsaccess),
+        "csaccess": list(csaccess),
+        "loa_role_id": loa_role_id,
+        "ticket_logs_channel_id": ticket_logs_channel_id,
+        "category_id": category_id
+    })
 
-def load_setup() -> Dict[str, Any]:
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT assistance_channel_id, general_requests_channel_id, community_requests_channel_id, gsaccess, csaccess, loa_role_id, ticket_logs_channel_id, category_id FROM setup WHERE id = 1")
-    row = c.fetchone()
-    conn.close()
+# In-memory config per guild. load_setup() serves from here after the first
+# read and save_setup() replaces entries, so interactions don't touch the DB
+# for config.
+_setup_cache: Dict[int, Dict[str, Any]] = {}
+
+def _index_setup(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    # Precompute role sets so permission checks are a single set operation
+    gs = frozenset(cfg["gsaccess"])
+    cs = frozenset(cfg["csaccess"])
+    cfg["gsaccess_roles"] = gs
+    cfg["csaccess_roles"] = cs
+    cfg["staff_roles"] = gs | cs
+    cfg["loa_roles"] = frozenset([cfg["loa_role_id"]]) if cfg.get("loa_role_id") else frozenset()
+    return cfg
+
+def invalidate_setup(guild_id: Optional[int] = None):
+    if guild_id is None:
+        _setup_cache.clear()
+    else:
+        _setup_cache.pop(guild_id, None)
+
+def discard_role(guild_id: int, role_id: int):
+    # Drop a deleted role from the cached access sets
+    cfg = _setup_cache.get(guild_id)
+    if not cfg or role_id not in cfg["staff_roles"] | cfg["loa_roles"]:
+        return
+    cfg["gsaccess"] = [r for r in cfg["gsaccess"] if r != role_id]
+    cfg["csaccess"] = [r for r in cfg["csaccess"] if r != role_id]
+    if cfg.get("loa_role_id") == role_id:
+        cfg["loa_role_id"] = None
+    _index_setup(cfg)
+
+def access_roles(cfg: Dict[str, Any], ttype: str) -> frozenset:
+    return cfg["gsaccess_roles"] if ttype == "general" else cfg["csaccess_roles"]
+
+def claim_denial(cfg: Dict[str, Any], member_role_ids: AbstractSet[int], ttype: str) -> Optional[str]:
+    # Returns None when the member may claim, otherwise "loa" or "denied"
+    if not cfg["loa_roles"].isdisjoint(member_role_ids):
+        return "loa"
+    if access_roles(cfg, ttype).isdisjoint(member_role_ids):
+        return "denied"
+    return None
+
+def can_close(cfg: Dict[str, Any], member_role_ids: AbstractSet[int]) -> bool:
+    return not cfg["staff_roles"].isdisjoint(member_role_ids)
+
+async def load_setup(guild_id: int) -> Dict[str, Any]:
+    cfg = _setup_cache.get(guild_id)
+    if cfg is not None:
+        return cfg
+    select = f"SELECT {', '.join(_SETUP_COLUMNS)} FROM setup WHERE guild_id = ?"
+    def op(conn):
+        return conn.execute(select, (guild_id,)).fetchone()
+    row = await get_storage().read(op)
     if not row:
-        return {}
+        # Unconfigured guild: cache an empty config so checks fail closed
+        row = (None,) * len(_SETUP_COLUMNS)
+    cfg = _setup_from_row(row)
+    _setup_cache[guild_id] = cfg
+    return cfg
+
+def _setup_from_row(row) -> Dict[str, Any]:
     assistance_channel_id, gen_ch, com_ch, gs, cs, loa, logs, cat = row
     def load_list(x):
         try:
             return json.loads(x) if x else []
         except:
             return []
-    return {
+    return _index_setup({
         "assistance_channel_id": assistance_channel_id,
         "general_requests_channel_id": gen_ch,
         "community_requests_channel_id": com_ch,
@@ -101,46 +526,324 @@ def load_setup() -> Dict[str, Any]:
         "loa_role_id": loa,
         "ticket_logs_channel_id": logs,
         "category_id": cat
-    }
+    })
 
-def create_ticket_record(channel_id: int, author_id: int, ttype: str, description: str, created_at: int):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("""
-      INSERT OR REPLACE INTO tickets (channel_id, author_id, type, description, claimed_by, created_at)
-      VALUES (?, ?, ?, ?, ?, ?)
-    """, (channel_id, author_id, ttype, description, None, created_at))
-    conn.commit()
-    conn.close()
+async def warm_setup_cache() -> int:
+    # Load every configured guild in one query at startup; returns the count.
+    # The legacy row is left for adopt_legacy_setup.
+    select = f"SELECT guild_id, {', '.join(_SETUP_COLUMNS)} FROM setup WHERE guild_id != ?"
+    def op(conn):
+        return conn.execute(select, (LEGACY_GUILD_ID,)).fetchall()
+    rows = await get_storage().read(op)
+    for row in rows:
+        _setup_cache.setdefault(row[0], _setup_from_row(row[1:]))
+    return len(rows)
 
-def set_ticket_claim(channel_id: int, claimer_id: int):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("UPDATE tickets SET claimed_by = ? WHERE channel_id = ?", (claimer_id, channel_id))
-    conn.commit()
-    conn.close()
+async def legacy_setup_channels() -> List[int]:
+    # Channels named by a migrated single-guild config no guild has adopted yet
+    def op(conn):
+        return conn.execute("""
+          SELECT category_id, assistance_channel_id, general_requests_channel_id,
+                 community_requests_channel_id, ticket_logs_channel_id
+          FROM setup WHERE guild_id = ?
+        """, (LEGACY_GUILD_ID,)).fetchone()
+    row = await get_storage().read(op)
+    return [channel_id for channel_id in row or () if channel_id]
 
-def get_ticket(channel_id: int) -> Optional[Dict[str, Any]]:
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT channel_id, author_id, type, description, claimed_by, created_at FROM tickets WHERE channel_id = ?", (channel_id,))
-    row = c.fetchone()
-    conn.close()
+async def adopt_legacy_setup(guild_id: int):
+    # Hand the migrated config, and the tickets that predate guild IDs, to
+    # the guild owning its channels
+    def op(conn):
+        if conn.execute("SELECT 1 FROM setup WHERE guild_id = ?", (guild_id,)).fetchone():
+            # The guild has run /setup_support since; that config wins
+            conn.execute("DELETE FROM setup WHERE guild_id = ?", (LEGACY_GUILD_ID,))
+        else:
+            conn.execute("UPDATE setup SET guild_id = ? WHERE guild_id = ?", (guild_id, LEGACY_GUILD_ID))
+        conn.execute("UPDATE tickets SET guild_id = ? WHERE guild_id IS NULL", (guild_id,))
+        conn.execute("UPDATE ticket_archive SET guild_id = ? WHERE guild_id IS NULL", (guild_id,))
+        # Their counters too, or closing them would leave the guild's negative
+        conn.execute("""
+          INSERT INTO ticket_counters (guild_id, name, value)
+          SELECT ?, name, SUM(value) FROM ticket_counters WHERE guild_id IS NULL GROUP BY name
+          ON CONFLICT (guild_id, name) DO UPDATE SET value = value + excluded.value
+        """, (guild_id,))
+        conn.execute("DELETE FROM ticket_counters WHERE guild_id IS NULL")
+    await get_storage().write(op)
+    _setup_cache.pop(guild_id, None)
+
+async def get_state(key: str) -> Optional[str]:
+    def op(conn):
+        row = conn.execute("SELECT value FROM bot_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+    return await get_storage().read(op)
+
+async def set_state(key: str, value: str):
+    def op(conn):
+        conn.execute("INSERT OR REPLACE INTO bot_state (key, value) VALUES (?, ?)", (key, value))
+    await get_storage().write(op)
+
+# Upper bounds (seconds) of the time-to-claim histogram buckets
+CLAIM_LATENCY_BUCKETS = (60, 300, 900, 1800, 3600, 3 * 3600, 6 * 3600, 12 * 3600, 24 * 3600, 72 * 3600)
+
+def _bump(conn: sqlite3.Connection, guild_id: Optional[int], name: str, delta: int = 1):
+    conn.execute("""
+      INSERT INTO ticket_counters (guild_id, name, value) VALUES (?, ?, ?)
+      ON CONFLICT (guild_id, name) DO UPDATE SET value = value + excluded.value
+    """, (guild_id, name, delta))
+
+def _latency_bucket(seconds: int) -> int:
+    for i, bound in enumerate(CLAIM_LATENCY_BUCKETS):
+        if seconds <= bound:
+            return i
+    return len(CLAIM_LATENCY_BUCKETS)
+
+async def create_ticket_record(guild_id: int, channel_id: int, author_id: int, ttype: str, description: str, created_at: int):
+    def op(conn):
+        conn.execute("""
+          INSERT OR REPLACE INTO tickets (channel_id, guild_id, author_id, type, description, claimed_by, created_at)
+          VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (channel_id, guild_id, author_id, ttype, description, None, created_at))
+        _bump(conn, guild_id, f"opened:{ttype}")
+    await get_storage().write(op)
+
+async def claim_ticket(channel_id: int, claimer_id: int) -> Tuple[bool, Optional[int]]:
+    # Atomic compare-and-set: only the first claimer wins. Returns
+    # (won, current claimer); the claimer is None if the ticket doesn't exist.
+    claimed_at = int(time.time())
+    def op(conn):
+        cur = conn.execute("UPDATE tickets SET claimed_by = ?, claimed_at = ? WHERE channel_id = ? AND claimed_by IS NULL", (claimer_id, claimed_at, channel_id))
+        if cur.rowcount == 1:
+            guild_id, ttype, created_at = conn.execute("SELECT guild_id, type, created_at FROM tickets WHERE channel_id = ?", (channel_id,)).fetchone()
+            waited = max(0, claimed_at - (created_at or claimed_at))
+            _bump(conn, guild_id, f"claimed:{ttype}")
+            _bump(conn, guild_id, "claim_seconds", waited)
+            _bump(conn, guild_id, f"claim_latency:{_latency_bucket(waited)}")
+            _bump(conn, guild_id, f"staff_claims:{claimer_id}")
+            _bump(conn, guild_id, f"staff_open:{claimer_id}")
+            return True, claimer_id
+        row = conn.execute("SELECT claimed_by FROM tickets WHERE channel_id = ?", (channel_id,)).fetchone()
+        return False, (row[0] if row else None)
+    return await get_storage().write(op)
+
+async def get_ticket(channel_id: int) -> Optional[Dict[str, Any]]:
+    def op(conn):
+        return conn.execute("SELECT channel_id, guild_id, author_id, type, description, claimed_by, created_at, claimed_at FROM tickets WHERE channel_id = ?", (channel_id,)).fetchone()
+    row = await get_storage().read(op)
     if not row:
         return None
-    channel_id, author_id, ttype, description, claimed_by, created_at = row
+    channel_id, guild_id, author_id, ttype, description, claimed_by, created_at, claimed_at = row
     return {
         "channel_id": channel_id,
+        "guild_id": guild_id,
         "author_id": author_id,
         "type": ttype,
         "description": description,
         "claimed_by": claimed_by,
-        "created_at": created_at
+        "created_at": created_at,
+        "claimed_at": claimed_at
     }
 
-def clear_ticket(channel_id: int):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("DELETE FROM tickets WHERE channel_id = ?", (channel_id,))
-    conn.commit()
-    conn.close()
+_TICKET_COLUMNS = "channel_id, guild_id, author_id, type, description, claimed_by, created_at, claimed_at"
+
+def _ticket_row(row) -> Dict[str, Any]:
+    return dict(zip(_TICKET_COLUMNS.split(", "), row))
+
+async def list_open_tickets() -> List[Tuple[int, int, int, str, Optional[int]]]:
+    # (channel_id, guild_id, author_id, type, claimed_by) for every open ticket
+    def op(conn):
+        return conn.execute("SELECT channel_id, guild_id, author_id, type, claimed_by FROM tickets").fetchall()
+    return await get_storage().read(op)
+
+async def find_unclaimed_tickets(created_before: int) -> List[Dict[str, Any]]:
+    # Served by idx_tickets_claim_age: claimed_by IS NULL then a created_at range
+    def op(conn):
+        return conn.execute(f"SELECT {_TICKET_COLUMNS} FROM tickets WHERE claimed_by IS NULL AND created_at < ? ORDER BY created_at",
+                            (created_before,)).fetchall()
+    return [_ticket_row(r) for r in await get_storage().read(op)]
+
+async def find_tickets_created_before(guild_ids: List[int], created_before: int) -> List[Dict[str, Any]]:
+    # One idx_tickets_guild range scan per guild
+    def op(conn):
+        rows = []
+        for guild_id in guild_ids:
+            rows += conn.execute(f"SELECT {_TICKET_COLUMNS} FROM tickets WHERE guild_id = ? AND created_at < ? ORDER BY created_at",
+                                 (guild_id, created_before)).fetchall()
+        return rows
+    return [_ticket_row(r) for r in await get_storage().read(op)]
+
+async def archive_ticket(channel_id: int, closed_by: int, closed_at: int) -> Optional[int]:
+    # Move the ticket to ticket_archive and update the close counters.
+    # Returns who had it claimed, if anyone.
+    def op(conn):
+        row = conn.execute("SELECT guild_id, type, claimed_by FROM tickets WHERE channel_id = ?", (channel_id,)).fetchone()
+        if not row:
+            return None
+        guild_id, ttype, claimed_by = row
+        conn.execute("""
+          INSERT OR REPLACE INTO ticket_archive (channel_id, guild_id, author_id, type, description, claimed_by, created_at, claimed_at, closed_at, closed_by)
+          SELECT channel_id, guild_id, author_id, type, description, claimed_by, created_at, claimed_at, ?, ?
+          FROM tickets WHERE channel_id = ?
+        """, (closed_at, closed_by, channel_id))
+        conn.execute("DELETE FROM tickets WHERE channel_id = ?", (channel_id,))
+        _bump(conn, guild_id, f"closed:{ttype}")
+        if claimed_by:
+            _bump(conn, guild_id, f"staff_open:{claimed_by}", -1)
+        return claimed_by
+    return await get_storage().write(op)
+
+async def get_ticket_stats(guild_id: int) -> Dict[str, int]:
+    # Reads only the guild's counters, independent of how many tickets exist
+    def op(conn):
+        return conn.execute("SELECT name, value FROM ticket_counters WHERE guild_id = ?", (guild_id,)).fetchall()
+    return dict(await get_storage().read(op))
+
+def median_claim_bound(stats: Dict[str, int]) -> Optional[int]:
+    # Upper bound of the histogram bucket holding the median time-to-claim;
+    # -1 means beyond the last bucket, None means no claims yet
+    counts = [stats.get(f"claim_latency:{i}", 0) for i in range(len(CLAIM_LATENCY_BUCKETS) + 1)]
+    total = sum(counts)
+    if not total:
+        return None
+    seen = 0
+    for i, n in enumerate(counts):
+        seen += n
+        if seen * 2 >= total:
+            return CLAIM_LATENCY_BUCKETS[i] if i < len(CLAIM_LATENCY_BUCKETS) else -1
+    return -1
+
+async def get_overflow_categories(guild_id: int, base_category_id: int) -> List[int]:
+    def op(conn):
+        return conn.execute("SELECT category_id FROM ticket_categories WHERE guild_id = ? AND base_category_id = ? ORDER BY rowid",
+                            (guild_id, base_category_id)).fetchall()
+    return [r[0] for r in await get_storage().read(op)]
+
+async def add_overflow_category(guild_id: int, base_category_id: int, category_id: int):
+    def op(conn):
+        conn.execute("INSERT OR REPLACE INTO ticket_categories (category_id, guild_id, base_category_id) VALUES (?, ?, ?)",
+                     (category_id, guild_id, base_category_id))
+    await get_storage().write(op)
+
+async def remove_overflow_category(category_id: int):
+    def op(conn):
+        conn.execute("DELETE FROM ticket_categories WHERE category_id = ?", (category_id,))
+    await get_storage().write(op)
+
+async def record_transcript(guild_id: int, channel_id: int, path: str, message_count: int, search_text: Optional[str] = None):
+    def op(conn):
+        conn.execute("""
+          INSERT OR REPLACE INTO transcripts (channel_id, guild_id, path, message_count, created_at, search_text)
+          VALUES (?, ?, ?, ?, ?, ?)
+        """, (channel_id, guild_id, path, message_count, int(time.time()), search_text))
+    await get_storage().write(op)
+
+def _fts_query(text: str) -> str:
+    # Quote every term so user input can't trip FTS5 syntax; terms are ANDed
+    return " ".join('"' + term.replace('"', '""') + '"' for term in text.split())
+
+# Discord snowflakes start at this epoch (ms); a channel's ID encodes when it was created
+DISCORD_EPOCH_MS = 1420070400000
+# Most tickets a since= filter scans for its lowest channel ID (see _channel_floor)
+SEARCH_BOUND_SCAN = 5000
+
+def _snowflake_at(ts: int) -> int:
+    return (ts * 1000 - DISCORD_EPOCH_MS) << 22
+
+def _channel_floor(conn: sqlite3.Connection, guild_id: int, since: int, until: Optional[int]) -> Tuple[bool, Optional[int]]:
+    # Lowest channel ID among the guild's tickets created in [since, until),
+    # as (any tickets in range, bound). Pooled channels can be created long
+    # before their ticket opens, so this comes from the tickets themselves.
+    # Ranges wider than SEARCH_BOUND_SCAN get no bound: they fill a page fast.
+    upper = "AND created_at < ?" if until is not None else ""
+    args = [guild_id, since] + ([until] if until is not None else []) + [SEARCH_BOUND_SCAN]
+    rows = conn.execute(f"""
+      SELECT MIN(channel_id), COUNT(*) FROM (
+        SELECT channel_id FROM ticket_archive WHERE guild_id = ? AND created_at >= ? {upper} LIMIT ?)
+      UNION ALL
+      SELECT MIN(channel_id), COUNT(*) FROM (
+        SELECT channel_id FROM tickets WHERE guild_id = ? AND created_at >= ? {upper} LIMIT ?)
+    """, args * 2).fetchall()
+    if all(n == 0 for _, n in rows):
+        return False, None
+    if any(n >= SEARCH_BOUND_SCAN for _, n in rows):
+        return True, None
+    return True, min(lo for lo, n in rows if n)
+
+async def search_tickets(
+    guild_id: int,
+    query: str,
+    author_id: Optional[int] = None,
+    ttype: Optional[str] = None,
+    since: Optional[int] = None,
+    until: Optional[int] = None,
+    limit: int = 10,
+    offset: int = 0
+) -> List[Dict[str, Any]]:
+    match = _fts_query(query)
+    if not match:
+        return []
+    # guild_id, author_id, type and created_at are UNINDEXED in ticket_fts and
+    # only checked row by row after MATCH, so selective filters are also
+    # expressed as rowid (channel ID) constraints, which FTS5 can seek on
+    where = ["ticket_fts MATCH ?", "guild_id = ?"]
+    params: List[Any] = [match, guild_id]
+    if author_id is not None:
+        # The author's tickets, from the tickets and ticket_archive indexes
+        where += ["author_id = ?", """rowid IN (
+            SELECT channel_id FROM ticket_archive WHERE guild_id = ? AND author_id = ?
+            UNION ALL SELECT channel_id FROM tickets WHERE guild_id = ? AND author_id = ?)"""]
+        params += [author_id, guild_id, author_id, guild_id, author_id]
+    if ttype is not None:
+        where.append("type = ?")
+        params.append(ttype)
+    if until is not None:
+        # A ticket's channel always exists before the ticket is opened
+        where += ["created_at < ?", "rowid < ?"]
+        params += [until, _snowflake_at(until)]
+    if since is not None:
+        where.append("created_at >= ?")
+        params.append(since)
+    def op(conn):
+        clauses, args = list(where), list(params)
+        if since is not None:
+            found, floor = _channel_floor(conn, guild_id, since, until)
+            if not found:
+                return []
+            if floor is not None:
+                clauses.append("rowid >= ?")
+                args.append(floor)
+        # Newest first: FTS5 walks rowids (channel snowflakes) in order and
+        # stops at the page boundary instead of ranking every match
+        return conn.execute(f"""
+          SELECT rowid, author_id, type, created_at, archived,
+                 snippet(ticket_fts, -1, '**', '**', '…', 16)
+          FROM ticket_fts
+          WHERE {" AND ".join(clauses)}
+          ORDER BY rowid DESC LIMIT ? OFFSET ?
+        """, args + [limit, offset]).fetchall()
+    rows = await get_storage().read(op)
+    return [{
+        "channel_id": channel_id,
+        "author_id": author_id,
+        "type": ttype,
+        "created_at": created_at,
+        "archived": bool(archived),
+        "snippet": snippet
+    } for channel_id, author_id, ttype, created_at, archived, snippet in rows]
+
+async def enqueue_log_event(channel_id: int, embed: Dict[str, Any]) -> int:
+    def op(conn):
+        cur = conn.execute("INSERT INTO log_outbox (channel_id, embed, created_at) VALUES (?, ?, ?)",
+                           (channel_id, json.dumps(embed), int(time.time())))
+        return cur.lastrowid
+    return await get_storage().write(op)
+
+async def pending_log_events() -> List[Tuple[int, int, Dict[str, Any]]]:
+    def op(conn):
+        return conn.execute("SELECT id, channel_id, embed FROM log_outbox ORDER BY id").fetchall()
+    rows = await get_storage().read(op)
+    return [(event_id, channel_id, json.loads(embed)) for event_id, channel_id, embed in rows]
+
+async def delete_log_events(event_ids: List[int]):
+    def op(conn):
+        conn.executemany("DELETE FROM log_outbox WHERE id = ?", [(i,) for i in event_ids])
+    await get_storage().write(op)